@@ -0,0 +1,106 @@
+"""
+Benchmark script to measure CLI cold-start time
+Runs each command in a fresh interpreter and reports the median wall-clock time
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from contextlib import contextmanager
+
+# "eager imports" is only a proxy for the old startup cost: it loads the libraries
+# main.py used to import at startup, not the old main.py itself. Use --baseline to time
+# `import main` at an earlier revision instead.
+COMMANDS = {
+    "eager imports (proxy)": [sys.executable, "-c", "import openai, requests, PIL.Image, config"],
+    "import main": [sys.executable, "-c", "import main"],
+    "main.py --help": [sys.executable, "main.py", "--help"],
+}
+
+
+def time_command(command, runs, cwd=None):
+    """
+    Runs a command several times in fresh interpreters.
+
+    Args:
+    command (list): The command and its arguments.
+    runs (int): How many times to run it.
+    cwd (str): The directory to run it in. Defaults to the current directory.
+
+    Returns:
+    list: The wall-clock time of each run in milliseconds.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, cwd=cwd)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+@contextmanager
+def baseline_checkout(revision):
+    """
+    Checks out a git revision in a temporary worktree for timing.
+
+    config.py is not tracked, so the local copy is placed in the worktree.
+
+    Args:
+    revision (str): The git revision to check out.
+
+    Yields:
+    str: The path of the worktree, removed again afterwards.
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "baseline")
+    subprocess.run(["git", "worktree", "add", "--detach", path, revision], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if os.path.exists("config.py"):
+            shutil.copyfile("config.py", os.path.join(path, "config.py"))
+        yield path
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", path], check=True)
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def print_timings(name, timings):
+    """Prints the median, minimum and maximum of a command's timings."""
+    print(f"  {name:<26} median {statistics.median(timings):7.1f} ms   "
+          f"min {min(timings):7.1f} ms   max {max(timings):7.1f} ms")
+
+
+def main():
+    """Run the startup benchmark"""
+    parser = argparse.ArgumentParser(description="Measure main.py cold-start time")
+    parser.add_argument("--runs", type=int, default=10, help="runs per command (default: 10)")
+    parser.add_argument("--baseline", metavar="REVISION",
+                        help="also time `import main` at this git revision, e.g. the commit "
+                             "before the lazy imports")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("  CLI COLD-START BENCHMARK")
+    print("=" * 70)
+    print()
+
+    # Warm the OS file cache so the first command isn't penalized
+    time_command([sys.executable, "-c", "pass"], 1)
+
+    if args.baseline:
+        with baseline_checkout(args.baseline) as path:
+            timings = time_command(COMMANDS["import main"], args.runs, cwd=path)
+        print_timings(f"import main ({args.baseline})", timings)
+
+    for name, command in COMMANDS.items():
+        print_timings(name, time_command(command, args.runs))
+
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+# concurrency.py
+
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+import config
+
+# Adaptive concurrency control: each deployment gets its own in-flight limit, raised
+# additively while latency stays healthy and cut multiplicatively on throttling (429)
+# or when latency climbs above its baseline (AIMD with a latency gradient)
+
+_SMOOTHING = 0.2
+_BASELINE_WINDOW = 60.0
+_RECENT_CHANGES = 50
+DEFAULT_OPERATION = "default"
+
+# Retries of failed calls: the attempt count matches the openai SDK's default of two
+# retries, with exponential backoff unless the service sends Retry-After
+_MAX_ATTEMPTS = 3
+_RETRY_BASE_DELAY = 0.5
+_MAX_RETRY_DELAY = 60.0
+_RETRYABLE_STATUS_CODES = {408, 409, 429}
+# Exception class names (anywhere in the class hierarchy) of connection failures and
+# timeouts from openai (APIConnectionError, APITimeoutError) and requests
+_CONNECTION_ERROR_NAMES = {"APIConnectionError", "ConnectionError", "Timeout", "TimeoutError"}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def is_throttled(error):
+    """
+    Checks whether an exception is a throttling (HTTP 429) response.
+
+    Works for openai.RateLimitError and other openai API errors (status_code) as well as
+    requests.HTTPError (response.status_code).
+
+    Args:
+    error (Exception): The exception raised by the API call.
+
+    Returns:
+    bool: True if the service rejected the request with HTTP 429.
+    """
+    return _status_code(error) == 429
+
+
+def is_retryable(error):
+    """
+    Checks whether a failed call is worth retrying.
+
+    Args:
+    error (Exception): The exception raised by the API call.
+
+    Returns:
+    bool: True for throttling, timeouts, conflicts, server errors and connection failures.
+    """
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in _RETRYABLE_STATUS_CODES or status_code >= 500
+    return any(cls.__name__ in _CONNECTION_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def _status_code(error):
+    """Returns the HTTP status code of an openai or requests error, or None."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code
+
+
+def _retry_delay(error, attempt):
+    """Returns how long to wait before the next attempt, honoring Retry-After headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, seconds_per_unit in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return min(float(headers.get(header)) * seconds_per_unit, _MAX_RETRY_DELAY)
+        except (TypeError, ValueError):
+            continue
+    backoff = min(_RETRY_BASE_DELAY * 2 ** (attempt - 1), _MAX_RETRY_DELAY)
+    return backoff * random.uniform(0.5, 1.0)
+
+
+class _LatencyTracker:
+    """Smoothed latency and baseline (lowest recent latency) of one kind of request."""
+
+    def __init__(self):
+        self.smoothed = None
+        self.baseline = None
+        self._window_start = time.monotonic()
+        self._window_min = None
+        self._previous_window_min = None
+
+    def observe(self, latency, now):
+        """Updates the smoothed latency and the baseline (minimum over a rolling window)."""
+        if self.smoothed is None:
+            self.smoothed = latency
+        else:
+            self.smoothed += _SMOOTHING * (latency - self.smoothed)
+
+        # Keep the minimum of the current and previous windows, so the baseline follows
+        # a lasting change in service latency within two windows
+        if now - self._window_start >= _BASELINE_WINDOW:
+            self._previous_window_min = self._window_min
+            self._window_min = None
+            self._window_start = now
+        if self._window_min is None or latency < self._window_min:
+            self._window_min = latency
+        self.baseline = min(
+            value for value in (self._window_min, self._previous_window_min) if value is not None
+        )
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of requests in flight to one deployment and adapts the limit.
+
+    After each successful request the limit grows by 1/limit (about +1 per round trip of
+    a full window). A throttled request multiplies it by the decrease factor, and a
+    smoothed latency above `latency_tolerance` times the baseline latency (the lowest
+    seen over the last one to two minutes) shrinks it in proportion to the overshoot.
+    At most one decrease happens per smoothed round-trip time, so a burst of failures
+    from one window counts once.
+
+    Latency is tracked per operation (e.g. "classification" and "description" on the
+    same deployment), so a slower kind of request isn't mistaken for congestion.
+
+    Use request() as a context manager around each API call, or the limiter itself for
+    a single kind of request.
+    """
+
+    def __init__(self, name, initial_limit=None, min_limit=None, max_limit=None,
+                 latency_tolerance=None, decrease_factor=None):
+        """
+        Creates a limiter for one deployment.
+
+        Args:
+        name (str): The deployment name, used in metrics.
+        initial_limit (int): Starting in-flight limit. Defaults to config.CONCURRENCY_INITIAL_LIMIT.
+        min_limit (int): Lowest allowed limit. Defaults to config.CONCURRENCY_MIN_LIMIT.
+        max_limit (int): Highest allowed limit. Defaults to config.CONCURRENCY_MAX_LIMIT.
+        latency_tolerance (float): Allowed ratio of smoothed to baseline latency before the
+            limit is reduced. Defaults to config.CONCURRENCY_LATENCY_TOLERANCE.
+        decrease_factor (float): Multiplier applied on throttling, and the largest cut
+            applied for high latency. Defaults to config.CONCURRENCY_DECREASE_FACTOR.
+        """
+        self.name = name
+        self.min_limit = min_limit or config.CONCURRENCY_MIN_LIMIT
+        self.max_limit = max_limit or config.CONCURRENCY_MAX_LIMIT
+        self.latency_tolerance = latency_tolerance or config.CONCURRENCY_LATENCY_TOLERANCE
+        self.decrease_factor = decrease_factor or config.CONCURRENCY_DECREASE_FACTOR
+        self.limit = float(initial_limit or config.CONCURRENCY_INITIAL_LIMIT)
+
+        self.in_flight = 0
+        self.counters = {"requests": 0, "throttled": 0, "errors": 0}
+        self.change_counts = {"increase": 0, "throttled": 0, "latency": 0}
+        self.recent_changes = deque(maxlen=_RECENT_CHANGES)
+
+        self._last_decrease = 0.0
+        self._latency = {}
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def __enter__(self):
+        self.acquire()
+        self._local.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        latency = time.perf_counter() - self._local.start
+        if exc_value is None:
+            self.release(latency)
+        else:
+            self.release(latency, throttled=is_throttled(exc_value), error=True)
+        return False
+
+    @contextmanager
+    def request(self, operation=DEFAULT_OPERATION, size=None):
+        """
+        Holds a request slot around one API call and records its outcome.
+
+        Args:
+        operation (str): The kind of request; its latency is only compared with the
+            baseline of the same operation.
+        size (float): The size of the request's input (e.g. megabytes of audio), for
+            calls whose latency grows with it; latency is divided by it before comparing.
+
+        Yields:
+        AdaptiveLimiter: This limiter.
+        """
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield self
+        except BaseException as e:
+            self.release(time.perf_counter() - start, throttled=is_throttled(e), error=True,
+                         operation=operation)
+            raise
+        self.release((time.perf_counter() - start) / (size or 1.0), operation=operation)
+
+    def acquire(self):
+        """Blocks until a request slot is free under the current limit."""
+        with self._condition:
+            while self.in_flight >= max(int(self.limit), 1):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, throttled=False, error=False, operation=DEFAULT_OPERATION):
+        """
+        Frees a request slot and adjusts the limit from the request's outcome.
+
+        Args:
+        latency (float): How long the request took, in seconds (per unit of size, if sized).
+        throttled (bool): The service rejected the request with HTTP 429.
+        error (bool): The request failed (throttled requests are also errors).
+        operation (str): The kind of request, see request().
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self.counters["requests"] += 1
+            now = time.monotonic()
+            tracker = self._latency.setdefault(operation, _LatencyTracker())
+
+            if throttled:
+                self.counters["throttled"] += 1
+                self._decrease(self.limit * self.decrease_factor, "throttled", now, tracker)
+            elif error:
+                # Failures other than throttling say nothing about capacity
+                self.counters["errors"] += 1
+            else:
+                tracker.observe(latency, now)
+                target_latency = tracker.baseline * self.latency_tolerance
+                if tracker.smoothed > target_latency:
+                    ratio = max(target_latency / tracker.smoothed, self.decrease_factor)
+                    self._decrease(self.limit * ratio, "latency", now, tracker)
+                elif self.in_flight + 1 >= int(self.limit):
+                    # Only grow when the current limit is actually being used
+                    self._set_limit(min(self.limit + 1 / self.limit, self.max_limit), "increase")
+
+            self._condition.notify_all()
+
+    def metrics(self):
+        """
+        Returns the limiter's current state and the history of limit changes.
+
+        Returns:
+        dict: The current limit, requests in flight, counters, per-operation latencies
+        and changes.
+        """
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                **self.counters,
+                "latency": {
+                    operation: {"baseline": tracker.baseline, "smoothed": tracker.smoothed}
+                    for operation, tracker in self._latency.items()
+                },
+                "changes": dict(self.change_counts),
+                "recent_changes": list(self.recent_changes)
+            }
+
+    def _decrease(self, new_limit, reason, now, tracker):
+        """Lowers the limit unless it was already lowered within the last round trip."""
+        if now - self._last_decrease < (tracker.smoothed or 0.0):
+            return
+        self._last_decrease = now
+        self._set_limit(max(new_limit, self.min_limit), reason)
+
+    def _set_limit(self, new_limit, reason):
+        """Sets the limit and records a change whenever its whole-number value changes."""
+        old_limit = int(self.limit)
+        self.limit = new_limit
+        if int(new_limit) != old_limit:
+            self.change_counts[reason] += 1
+            self.recent_changes.append({
+                "time": time.time(),
+                "from": old_limit,
+                "to": int(new_limit),
+                "reason": reason
+            })
+
+
+def get_limiter(deployment):
+    """
+    Returns the shared limiter for a deployment, creating it on first use.
+
+    Args:
+    deployment (str): The deployment name.
+
+    Returns:
+    AdaptiveLimiter: The limiter all calls to that deployment go through.
+    """
+    with _limiters_lock:
+        if deployment not in _limiters:
+            _limiters[deployment] = AdaptiveLimiter(deployment)
+        return _limiters[deployment]
+
+
+def call_with_retries(deployment, call, operation=DEFAULT_OPERATION, size=None):
+    """
+    Makes an API call within a deployment's adaptive limit, retrying transient failures.
+
+    The clients are created without their own retries, so every throttled attempt
+    reaches the limiter. A failed attempt releases its slot (a 429 cuts the limit)
+    before waiting for Retry-After or the backoff delay, and the next attempt acquires a
+    slot again under the reduced limit.
+
+    Args:
+    deployment (str): The deployment name.
+    call (callable): Makes the API call and returns its result; called once per attempt.
+    operation (str): The kind of request, see AdaptiveLimiter.request().
+    size (float): The size of the request's input, see AdaptiveLimiter.request().
+
+    Returns:
+    object: The result of the first successful call.
+    """
+    limiter = get_limiter(deployment)
+    for attempt in range(1, _MAX_ATTEMPTS + 1):
+        try:
+            with limiter.request(operation, size):
+                return call()
+        except Exception as e:
+            if attempt == _MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"  ↻ {deployment} request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def get_concurrency_metrics():
+    """
+    Returns the metrics of every deployment's limiter.
+
+    Returns:
+    dict: Limiter metrics keyed by deployment name.
+    """
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.metrics() for limiter in limiters}
+
+
+def save_concurrency_metrics():
+    """
+    Writes the current limiter metrics to config.CONCURRENCY_METRICS_FILE.
+
+    Returns:
+    dict: The metrics that were written.
+    """
+    metrics = get_concurrency_metrics()
+    os.makedirs(os.path.dirname(config.CONCURRENCY_METRICS_FILE) or ".", exist_ok=True)
+    with open(config.CONCURRENCY_METRICS_FILE, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+    print(f"✓ Concurrency metrics saved to {config.CONCURRENCY_METRICS_FILE}")
+    return metrics
@@ -25,6 +25,7 @@ DALLE_ENDPOINT = os.getenv("DALLE_ENDPOINT", AZURE_OPENAI_ENDPOINT)
 WHISPER_DEPLOYMENT = "whisper"
 DALLE_DEPLOYMENT = "dall-e-3"
 GPT4O_DEPLOYMENT = "gpt-4o"
+GPT4O_MINI_DEPLOYMENT = "gpt-4o-mini"
 
 # API Versions
 WHISPER_API_VERSION = "2024-06-01"
@@ -35,6 +36,44 @@ GPT4O_API_VERSION = "2025-01-01-preview"
 AUDIO_DIR = "audio"
 OUTPUT_DIR = "output"
 CATEGORIES_FILE = "categories.json"
+TIER_STATS_FILE = os.path.join(OUTPUT_DIR, "tier_stats.json")
 
-# Create output directory if it doesn't exist
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Results Store
+# Every run is appended to a SQLite table; images are stored once per content hash.
+# Set SAVE_INTERMEDIATE_FILES to False to skip the per-run text/JSON files.
+RESULTS_DB = os.path.join(OUTPUT_DIR, "results.db")
+BLOB_DIR = os.path.join(OUTPUT_DIR, "blobs")
+RESULTS_BATCH_SIZE = 100
+SAVE_INTERMEDIATE_FILES = True
+
+# Near-Duplicate Detection
+# Complaints whose transcription has an estimated word overlap (Jaccard similarity)
+# of at least DEDUP_MIN_SIMILARITY with a stored one reuse the stored image,
+# description and classification instead of calling DALL-E and GPT-4o.
+DEDUP_ENABLED = True
+DEDUP_MIN_SIMILARITY = 0.8
+
+# Adaptive Concurrency (batch runs)
+# Batch runs process up to BATCH_WORKERS files at once. Calls to each deployment are
+# limited to an in-flight limit that grows by about +1 per round trip while latency stays
+# below CONCURRENCY_LATENCY_TOLERANCE x its lowest recent latency, and shrinks on 429
+# responses (x CONCURRENCY_DECREASE_FACTOR) or when latency rises above that tolerance.
+BATCH_WORKERS = 8
+CONCURRENCY_INITIAL_LIMIT = 2
+CONCURRENCY_MIN_LIMIT = 1
+CONCURRENCY_MAX_LIMIT = 32
+CONCURRENCY_LATENCY_TOLERANCE = 2.0
+CONCURRENCY_DECREASE_FACTOR = 0.5
+CONCURRENCY_METRICS_FILE = os.path.join(OUTPUT_DIR, "concurrency_metrics.json")
+
+# Model Tiering (classification and image description)
+# Tiers are tried in order; a request escalates to the next tier when the
+# self-reported confidence is below CONFIDENCE_THRESHOLD or validation fails.
+# Costs are USD per 1K tokens and only used for the recorded statistics.
+MODEL_TIERS = [
+    {"name": "small", "deployment": GPT4O_MINI_DEPLOYMENT,
+     "input_cost_per_1k": 0.00015, "output_cost_per_1k": 0.0006},
+    {"name": "large", "deployment": GPT4O_DEPLOYMENT,
+     "input_cost_per_1k": 0.0025, "output_cost_per_1k": 0.01},
+]
+CONFIDENCE_THRESHOLD = 0.7
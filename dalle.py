@@ -2,24 +2,30 @@ import os
 import json
 from urllib.parse import urljoin
 
-import requests
-
 import config
+from concurrency import call_with_retries
 
 # Function to generate an image representing the customer complaint
 
 
-def generate_image(prompt):
+def generate_image(prompt, image_path=None, save_files=None):
     """
     Generates an image based on a prompt using OpenAI's DALL-E model.
 
     Args:
     prompt (str): The prompt describing the image to generate.
+    image_path (str): Where to save the image. Defaults to generated_image.png in the output directory.
+    save_files (bool): Save image_prompt.txt. Defaults to config.SAVE_INTERMEDIATE_FILES.
 
     Returns:
     str: The path to the generated image.
     """
+    if save_files is None:
+        save_files = config.SAVE_INTERMEDIATE_FILES
+    
     try:
+        import requests
+
         # Build payload for Azure OpenAI image generation REST call
         payload = {
             "prompt": prompt,
@@ -35,13 +41,18 @@ def generate_image(prompt):
         base_endpoint = config.DALLE_ENDPOINT.rstrip("/")
         generate_url = f"{base_endpoint}/openai/deployments/{config.DALLE_DEPLOYMENT}/images/generations?api-version={config.DALLE_API_VERSION}"
 
-        response = requests.post(
-            generate_url,
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        response.raise_for_status()
+        def request_image():
+            response = requests.post(
+                generate_url,
+                headers=headers,
+                json=payload,
+                timeout=60
+            )
+            response.raise_for_status()
+            return response
+
+        # Call DALL-E within the deployment's adaptive concurrency limit, retrying transient failures
+        response = call_with_retries(config.DALLE_DEPLOYMENT, request_image, "image_generation")
 
         result = response.json()
         image_url = result["data"][0]["url"]
@@ -51,14 +62,13 @@ def generate_image(prompt):
         image_response.raise_for_status()
         
         # Save the image locally
-        image_path = os.path.join(config.OUTPUT_DIR, "generated_image.png")
+        image_path = image_path or os.path.join(config.OUTPUT_DIR, "generated_image.png")
         with open(image_path, "wb") as f:
             f.write(image_response.content)
         
         # Save the prompt used to generate the image
-        prompt_path = os.path.join(config.OUTPUT_DIR, "image_prompt.txt")
-        with open(prompt_path, "w", encoding="utf-8") as f:
-            f.write(prompt)
+        if save_files:
+            save_image_prompt(prompt)
         
         print(f"✓ Image generated and saved to {image_path}")
         return image_path
@@ -66,3 +76,19 @@ def generate_image(prompt):
     except Exception as e:
         print(f"✗ Error during image generation: {str(e)}")
         raise
+
+
+def save_image_prompt(prompt):
+    """
+    Saves the image generation prompt to image_prompt.txt in the output directory.
+
+    Args:
+    prompt (str): The prompt used to generate the image.
+
+    Returns:
+    str: The path to the saved prompt.
+    """
+    prompt_path = os.path.join(config.OUTPUT_DIR, "image_prompt.txt")
+    with open(prompt_path, "w", encoding="utf-8") as f:
+        f.write(prompt)
+    return prompt_path
@@ -0,0 +1,157 @@
+# dedup.py
+
+import re
+import struct
+import hashlib
+import threading
+import config
+
+# Near-duplicate detection: MinHash signatures of normalized transcriptions,
+# indexed by LSH bands in the results store so repeated complaints can reuse earlier results
+
+NUM_PERMUTATIONS = 32
+BAND_COUNT = 8
+ROWS_PER_BAND = NUM_PERMUTATIONS // BAND_COUNT
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_SIGNATURE_FORMAT = f"<{NUM_PERMUTATIONS}Q"
+
+
+def _permutation(index):
+    """Derives the fixed (a, b) coefficients of one MinHash permutation."""
+    digest = hashlib.blake2b(f"minhash-{index}".encode("utf-8"), digest_size=16).digest()
+    a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+    b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+    return a, b
+
+
+_PERMUTATIONS = [_permutation(index) for index in range(NUM_PERMUTATIONS)]
+
+_dedup_stats = {"lookups": 0, "hits": 0}
+_stats_lock = threading.Lock()
+
+
+def normalize_text(text):
+    """
+    Normalizes complaint text so formatting differences don't change the fingerprint.
+
+    Args:
+    text (str): The transcribed complaint.
+
+    Returns:
+    list: The lowercase words of the text with punctuation removed.
+    """
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def compute_fingerprint(text):
+    """
+    Computes the MinHash signature of the complaint text.
+
+    Words and word pairs are used as features, so the fraction of matching signature
+    values estimates how much wording two complaints share.
+
+    Args:
+    text (str): The transcribed complaint.
+
+    Returns:
+    tuple: NUM_PERMUTATIONS integers forming the signature, or None if the text has no
+    words (empty or silent recordings would otherwise all match each other).
+    """
+    words = normalize_text(text)
+    if not words:
+        return None
+    features = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+              for feature in features]
+    return tuple(
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(a, b):
+    """Returns the estimated Jaccard similarity of two signatures (0.0 - 1.0)."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERMUTATIONS
+
+
+def fingerprint_bands(fingerprint):
+    """
+    Hashes a signature into the LSH band keys used to look up candidates in the results store.
+
+    Complaints at the configured similarity threshold share at least one band key with
+    high probability, while unrelated complaints almost never do.
+
+    Args:
+    fingerprint (tuple): The MinHash signature.
+
+    Returns:
+    list: BAND_COUNT non-negative 63-bit integers.
+    """
+    bands = []
+    for band in range(BAND_COUNT):
+        rows = fingerprint[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f"<{ROWS_PER_BAND}Q", *rows), digest_size=8).digest()
+        bands.append(int.from_bytes(digest, "big") >> 1)
+    return bands
+
+
+def pack_fingerprint(fingerprint):
+    """Serializes a signature to bytes for storage."""
+    return struct.pack(_SIGNATURE_FORMAT, *fingerprint)
+
+
+def unpack_fingerprint(data):
+    """Deserializes a signature stored with pack_fingerprint()."""
+    return struct.unpack(_SIGNATURE_FORMAT, data)
+
+
+def find_near_duplicate(store, fingerprint):
+    """
+    Looks up a previously processed complaint similar to the given one.
+
+    Args:
+    store (ResultsStore): The results store holding earlier fingerprints.
+    fingerprint (tuple): The MinHash signature of the new complaint.
+
+    Returns:
+    dict: The most similar stored result at or above config.DEDUP_MIN_SIMILARITY, or None.
+    """
+    best_id = None
+    best_similarity = config.DEDUP_MIN_SIMILARITY
+    for candidate_id, candidate_fingerprint in store.find_by_fingerprint_bands(fingerprint_bands(fingerprint)):
+        similarity = estimate_similarity(fingerprint, candidate_fingerprint)
+        if similarity >= best_similarity:
+            best_id, best_similarity = candidate_id, similarity
+    best_match = store.get(best_id) if best_id is not None else None
+
+    with _stats_lock:
+        _dedup_stats["lookups"] += 1
+        if best_match is not None:
+            _dedup_stats["hits"] += 1
+    return best_match
+
+
+def get_dedup_stats():
+    """
+    Returns the dedup lookups and hits recorded since the last reset.
+
+    Returns:
+    dict: Lookup and hit counts plus the hit rate.
+    """
+    with _stats_lock:
+        lookups = _dedup_stats["lookups"]
+        hits = _dedup_stats["hits"]
+    return {
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": hits / lookups if lookups else 0.0
+    }
+
+
+def reset_dedup_stats():
+    """Resets the dedup counters, e.g. at the start of a new batch."""
+    with _stats_lock:
+        _dedup_stats["lookups"] = 0
+        _dedup_stats["hits"] = 0
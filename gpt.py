@@ -2,13 +2,49 @@
 
 import os
 import json
-from openai import AzureOpenAI
+import time
 import config
+from router import route_completion, parse_confidence, get_chat_client
+from prompts import load_categories, build_classification_messages
+
+# Function to validate a classification response from the model
+
+
+def parse_classification(classification_text, categories):
+    """
+    Parses and validates a classification response against the category catalogue.
+
+    Args:
+    classification_text (str): The JSON text returned by the model.
+    categories (dict): The available categories mapped to their subcategories.
+
+    Returns:
+    tuple: The classification dict and its self-reported confidence.
+    """
+    classification = json.loads(classification_text)
+
+    category = classification["category"]
+    subcategory = classification["subcategory"]
+    if category not in categories:
+        raise ValueError(f"unknown category '{category}'")
+    if subcategory not in categories[category]:
+        raise ValueError(f"unknown subcategory '{subcategory}' for category '{category}'")
+    if not classification.get("reasoning"):
+        raise ValueError("missing reasoning")
+
+    confidence = parse_confidence(classification)
+    classification = {
+        "category": category,
+        "subcategory": subcategory,
+        "reasoning": classification["reasoning"]
+    }
+    return classification, confidence
+
 
 # Function to classify the customer complaint based on the image description
 
 
-def classify_with_gpt(transcription, image_description):
+def classify_with_gpt(transcription, image_description, save_files=None):
     """
     Classifies the customer complaint into a category/subcategory based on the transcription 
     and image description.
@@ -16,89 +52,96 @@ def classify_with_gpt(transcription, image_description):
     Args:
     transcription (str): The transcribed text of the customer complaint.
     image_description (str): The description of the generated image.
+    save_files (bool): Save classification.json/.txt. Defaults to config.SAVE_INTERMEDIATE_FILES.
 
     Returns:
-    dict: A dictionary containing the category, subcategory, and reasoning.
+    dict: A dictionary containing the category, subcategory, reasoning, confidence
+    and the model tier that produced the classification.
     """
+    if save_files is None:
+        save_files = config.SAVE_INTERMEDIATE_FILES
+    
     try:
-        # Load categories from JSON file
-        with open(config.CATEGORIES_FILE, "r", encoding="utf-8") as f:
-            categories = json.load(f)
-        
-        # Create a formatted string of available categories
-        categories_text = json.dumps(categories, indent=2)
-        
-        # Initialize the Azure OpenAI client
-        client = AzureOpenAI(
-            api_key=config.AZURE_OPENAI_API_KEY,
-            api_version=config.GPT4O_API_VERSION,
-            azure_endpoint=config.AZURE_OPENAI_ENDPOINT
-        )
+        categories = load_categories()
         
-        # Create the classification prompt
-        system_prompt = """You are an expert customer service classifier. Your task is to categorize customer complaints into the appropriate category and subcategory based on the complaint details.
-
-You will be provided with:
-1. The customer's original complaint (transcribed from audio)
-2. A description of an image representing the issue
-3. A list of available categories and subcategories
-
-Analyze the information carefully and classify the complaint into the most appropriate category and subcategory pair."""
-
-        user_prompt = f"""Please classify the following customer complaint:
-
-CUSTOMER COMPLAINT:
-{transcription}
-
-IMAGE DESCRIPTION:
-{image_description}
-
-AVAILABLE CATEGORIES AND SUBCATEGORIES:
-{categories_text}
-
-Based on the complaint and image description, determine:
-1. The most appropriate CATEGORY
-2. The most appropriate SUBCATEGORY within that category
-3. A brief explanation of why this classification was chosen
-
-Respond in the following JSON format:
-{{
-    "category": "Category Name",
-    "subcategory": "Subcategory Name",
-    "reasoning": "Brief explanation of the classification"
-}}"""
-
-        # Call the GPT model for classification
-        response = client.chat.completions.create(
-            model=config.GPT4O_DEPLOYMENT,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+        # Call the model tiers for classification, escalating on low confidence
+        classification, confidence, tier = route_completion(
+            get_chat_client(),
+            build_classification_messages(transcription, image_description),
+            lambda text: parse_classification(text, categories),
+            operation="classification",
             temperature=0.3,  # Lower temperature for more consistent classification
             max_tokens=500,
             response_format={"type": "json_object"}
         )
-        
-        # Extract and parse the classification result
-        classification_text = response.choices[0].message.content
-        classification = json.loads(classification_text)
+        classification["confidence"] = confidence
+        classification["model_tier"] = tier
         
         # Save the classification to output directory
-        classification_path = os.path.join(config.OUTPUT_DIR, "classification.json")
-        with open(classification_path, "w", encoding="utf-8") as f:
-            json.dump(classification, f, indent=2)
-        
-        # Also save as readable text
-        classification_text_path = os.path.join(config.OUTPUT_DIR, "classification.txt")
-        with open(classification_text_path, "w", encoding="utf-8") as f:
-            f.write(f"Category: {classification['category']}\n")
-            f.write(f"Subcategory: {classification['subcategory']}\n")
-            f.write(f"Reasoning: {classification['reasoning']}\n")
-        
-        print(f"✓ Classification completed and saved to {classification_path}")
+        if save_files:
+            classification_path = save_classification(classification)
+            print(f"✓ Classification completed and saved to {classification_path}")
+        else:
+            print("✓ Classification completed")
         return classification
     
     except Exception as e:
         print(f"✗ Error during classification: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def save_classification(classification):
+    """
+    Saves the classification to classification.json and classification.txt in the output directory.
+
+    Args:
+    classification (dict): The classification results.
+
+    Returns:
+    str: The path to the saved JSON file.
+    """
+    classification_path = os.path.join(config.OUTPUT_DIR, "classification.json")
+    with open(classification_path, "w", encoding="utf-8") as f:
+        json.dump(classification, f, indent=2)
+    
+    # Also save as readable text
+    classification_text_path = os.path.join(config.OUTPUT_DIR, "classification.txt")
+    with open(classification_text_path, "w", encoding="utf-8") as f:
+        f.write(f"Category: {classification['category']}\n")
+        f.write(f"Subcategory: {classification['subcategory']}\n")
+        f.write(f"Reasoning: {classification['reasoning']}\n")
+        f.write(f"Confidence: {classification['confidence']:.2f}\n")
+        f.write(f"Model Tier: {classification['model_tier']}\n")
+    return classification_path
+
+
+# Function to warm up the model tiers before the first real classification
+
+
+def warm_up():
+    """
+    Sends a minimal request to every model tier.
+
+    This opens the shared client's connection, so the first real request of a batch
+    doesn't pay the connection setup, and checks that each deployment responds. It
+    doesn't prime the prompt cache: the static prefix is below the caching minimum
+    (see prompts.classification_system_prompt).
+
+    Returns:
+    dict: The warm-up latency in seconds for each tier that responded.
+    """
+    client = get_chat_client()
+    messages = [{"role": "user", "content": "ping"}]
+    latencies = {}
+    
+    for tier in config.MODEL_TIERS:
+        start = time.perf_counter()
+        try:
+            client.chat.completions.create(model=tier["deployment"], messages=messages, max_tokens=1)
+        except Exception as e:
+            print(f"✗ Warm-up of {tier['name']} tier failed: {str(e)}")
+            continue
+        latencies[tier["name"]] = time.perf_counter() - start
+        print(f"✓ Warmed up {tier['name']} tier in {latencies[tier['name']]:.2f}s")
+    
+    return latencies
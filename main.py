@@ -3,13 +3,21 @@
 import os
 import sys
 import json
+import uuid
+import shutil
+import argparse
+import itertools
 from datetime import datetime
 
 # Import functions from other modules
-from whisper import transcribe_audio
-from dalle import generate_image
-from vision import describe_image
-from gpt import classify_with_gpt
+# The stage modules (whisper, dalle, vision, gpt) are imported inside the functions that
+# use them, and import openai/requests/PIL the same way, so --help, query and stats don't
+# pay those import costs
+from router import get_tier_stats, save_tier_stats
+from results_store import ResultsStore
+from dedup import compute_fingerprint, find_near_duplicate, get_dedup_stats, reset_dedup_stats
+from pipeline import discover_audio_files, process_stream
+from concurrency import save_concurrency_metrics
 import config
 
 # Main function to orchestrate the workflow
@@ -68,107 +76,207 @@ def save_summary(transcription, prompt, image_path, description, classification)
     print(f"✓ Complete workflow summary saved to {summary_path}")
 
 
-def main(audio_file_path=None):
+def save_result(store, audio_file_path, transcription, prompt, image_path, description,
+                classification, fingerprint=None, duplicate_of=None):
+    """
+    Appends the workflow results to the results store.
+    
+    Args:
+    store (ResultsStore): The store to append the record to.
+    audio_file_path (str): Path to the processed audio file.
+    transcription (str): The transcribed audio text.
+    prompt (str): The image generation prompt.
+    image_path (str): Path to the generated image, stored as a content-addressed blob.
+    description (str): The image description.
+    classification (dict): The classification results.
+    fingerprint (tuple): The MinHash signature of the transcription, indexed for dedup lookups.
+    duplicate_of (int): Id of the stored complaint whose results were reused, if any.
+    
+    Returns:
+    str: The SHA-256 digest of the stored image.
+    """
+    image_sha256 = store.store_blob(image_path)
+    store.add({
+        "audio_path": audio_file_path,
+        "transcription": transcription,
+        "image_prompt": prompt,
+        "image_sha256": image_sha256,
+        "description": description,
+        "category": classification["category"],
+        "subcategory": classification["subcategory"],
+        "reasoning": classification["reasoning"],
+        "confidence": classification.get("confidence"),
+        "model_tier": classification.get("model_tier"),
+        "fingerprint": fingerprint,
+        "duplicate_of": duplicate_of
+    })
+    return image_sha256
+
+
+def generate_results(transcription, image_path=None, save_files=True):
+    """
+    Runs the generation steps (2-6) of the workflow for a new complaint.
+    
+    Args:
+    transcription (str): The transcribed customer complaint.
+    image_path (str): Where to save the generated image. Defaults to generated_image.png.
+    save_files (bool): Save the per-run intermediate files and the annotated image.
+    
+    Returns:
+    tuple: The image prompt, image path, image description and classification.
+    """
+    from dalle import generate_image
+    from vision import describe_image
+    from gpt import classify_with_gpt
+    
+    # Step 2: Create a prompt from the transcription
+    print_separator("STEP 2: Creating Image Generation Prompt")
+    
+    prompt = create_image_prompt(transcription)
+    print(f"Generated Prompt:\n{prompt}\n")
+    
+    # Step 3: Generate an image based on the prompt
+    print_separator("STEP 3: Generating Image with DALL-E 3")
+    
+    image_path = generate_image(prompt, image_path, save_files)
+    print(f"\nImage generated successfully!\n")
+    
+    # Step 4: Describe the generated image
+    print_separator("STEP 4: Analyzing Image with GPT-4o Vision")
+    
+    description = describe_image(image_path, save_files)
+    print(f"\nImage Description:\n{description}\n")
+    
+    # Step 5: Image annotation is handled within describe_image()
+    print_separator("STEP 5: Image Annotation")
+    if save_files:
+        print("✓ Annotated image created with issue highlight\n")
+    else:
+        print("✓ Skipped, intermediate files are disabled\n")
+    
+    # Step 6: Classify the complaint based on the image description
+    print_separator("STEP 6: Classifying Complaint")
+    
+    classification = classify_with_gpt(transcription, description, save_files)
+    return prompt, image_path, description, classification
+
+
+def reuse_results(store, duplicate, save_files=True):
+    """
+    Reuses the stored results of a near-duplicate complaint instead of calling the APIs.
+    
+    With save_files the reused image, prompt, description and classification are written
+    to the per-run output files, so they all describe this complaint rather than the
+    previous one.
+    
+    Args:
+    store (ResultsStore): The store holding the duplicate's image blob.
+    duplicate (dict): The stored result of the near-duplicate complaint.
+    save_files (bool): Write the reused results to the per-run intermediate files.
+    
+    Returns:
+    tuple: The image prompt, image path, image description and classification.
+    """
+    print_separator("STEPS 2-6: Reusing Near-Duplicate Results")
+    print(f"✓ Near-duplicate of {duplicate['audio_path']}, skipping image generation and classification\n")
+    
+    classification = {
+        "category": duplicate["category"],
+        "subcategory": duplicate["subcategory"],
+        "reasoning": duplicate["reasoning"],
+        "confidence": duplicate["confidence"],
+        "model_tier": duplicate["model_tier"]
+    }
+    image_path = store.blob_path(duplicate["image_sha256"])
+    
+    if save_files:
+        from dalle import save_image_prompt
+        from vision import save_description, annotate_image
+        from gpt import save_classification
+        
+        generated_path = os.path.join(config.OUTPUT_DIR, "generated_image.png")
+        shutil.copyfile(image_path, generated_path)
+        save_image_prompt(duplicate["image_prompt"])
+        save_description(duplicate["description"])
+        annotate_image(generated_path, duplicate["description"])
+        save_classification(classification)
+        print(f"✓ Reused results saved to {config.OUTPUT_DIR}")
+    
+    return duplicate["image_prompt"], image_path, duplicate["description"], classification
+
+
+def process_complaint(store, audio_file_path, image_path=None, save_files=None):
     """
-    Orchestrates the workflow for handling customer complaints.
+    Runs the workflow for one audio file and appends the result to the results store.
     
     Steps include:
-    1. Transcribe the audio complaint.
+    1. Transcribe the audio complaint and check for an already processed near-duplicate.
     2. Create a prompt from the transcription.
     3. Generate an image representing the issue.
     4. Describe the generated image.
     5. Annotate the reported issue in the image.
     6. Classify the complaint into a category/subcategory pair.
     
+    Steps 2-6 are skipped for near-duplicates, whose stored results are reused.
+    
     Args:
-    audio_file_path (str): Path to the audio file. If None, will look for files in audio directory.
+    store (ResultsStore): The store to look up duplicates in and append the result to.
+    audio_file_path (str): Path to the audio file.
+    image_path (str): Where to save the generated image. Defaults to generated_image.png.
+    save_files (bool): Save the per-run intermediate files and the annotated image.
+        Defaults to config.SAVE_INTERMEDIATE_FILES.
     
     Returns:
-    dict: A dictionary containing all results from the workflow.
+    dict: A dictionary containing all results from the workflow, or None if it failed.
     """
+    if save_files is None:
+        save_files = config.SAVE_INTERMEDIATE_FILES
+    
     try:
-        print_separator("CUSTOMER COMPLAINT CLASSIFICATION SYSTEM")
-        print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        from whisper import transcribe_audio
         
-        # Step 1: Find and transcribe the audio complaint
+        # Step 1: Transcribe the audio complaint
         print_separator("STEP 1: Audio Transcription")
+        print(f"Using audio file: {audio_file_path}")
         
-        if audio_file_path is None:
-            # Look for audio files in the audio directory
-            audio_files = [f for f in os.listdir(config.AUDIO_DIR) 
-                          if f.endswith(('.mp3', '.wav', '.m4a', '.ogg')) and f != '.gitkeep']
-            
-            if not audio_files:
-                print("✗ No audio files found in the 'audio' directory.")
-                print("  Please place an audio file (.mp3, .wav, .m4a, or .ogg) in the 'audio' folder.")
-                return None
-            
-            audio_file_path = os.path.join(config.AUDIO_DIR, audio_files[0])
-            print(f"Using audio file: {audio_file_path}")
-        
-        if not os.path.exists(audio_file_path):
-            print(f"✗ Audio file not found: {audio_file_path}")
-            return None
-        
-        transcription = transcribe_audio(audio_file_path)
+        transcription = transcribe_audio(audio_file_path, save_files)
         print(f"\nTranscription Result:\n{transcription}\n")
         
-        # Step 2: Create a prompt from the transcription
-        print_separator("STEP 2: Creating Image Generation Prompt")
-        
-        prompt = create_image_prompt(transcription)
-        print(f"Generated Prompt:\n{prompt}\n")
-        
-        # Step 3: Generate an image based on the prompt
-        print_separator("STEP 3: Generating Image with DALL-E 3")
-        
-        image_path = generate_image(prompt)
-        print(f"\nImage generated successfully!\n")
+        # Look up a near-duplicate complaint before spending API calls; transcriptions
+        # without any words have no fingerprint and are never treated as duplicates
+        fingerprint = compute_fingerprint(transcription)
+        duplicate = None
+        if config.DEDUP_ENABLED and fingerprint is not None:
+            duplicate = find_near_duplicate(store, fingerprint)
         
-        # Step 4: Describe the generated image
-        print_separator("STEP 4: Analyzing Image with GPT-4o Vision")
+        duplicate_of = None
+        if duplicate:
+            duplicate_of = duplicate["duplicate_of"] or duplicate["id"]
+            prompt, image_path, description, classification = reuse_results(store, duplicate, save_files)
+        else:
+            prompt, image_path, description, classification = generate_results(transcription, image_path,
+                                                                               save_files)
         
-        description = describe_image(image_path)
-        print(f"\nImage Description:\n{description}\n")
-        
-        # Step 5: Image annotation is handled within describe_image()
-        print_separator("STEP 5: Image Annotation")
-        print("✓ Annotated image created with issue highlight\n")
-        
-        # Step 6: Classify the complaint based on the image description
-        print_separator("STEP 6: Classifying Complaint")
-        
-        classification = classify_with_gpt(transcription, description)
         print(f"\nClassification Results:")
         print(f"  Category: {classification['category']}")
         print(f"  Subcategory: {classification['subcategory']}")
-        print(f"  Reasoning: {classification['reasoning']}\n")
-        
-        # Save complete summary
-        print_separator("WORKFLOW COMPLETE")
-        save_summary(transcription, prompt, image_path, description, classification)
+        print(f"  Reasoning: {classification['reasoning']}")
+        print(f"  Confidence: {classification['confidence']:.2f} ({classification['model_tier']} tier)\n")
         
-        print("\n📁 All intermediate results saved in the 'output' directory:")
-        print("   - transcription.txt")
-        print("   - image_prompt.txt")
-        print("   - generated_image.png")
-        print("   - image_description.txt")
-        print("   - annotated_image.png")
-        print("   - classification.json")
-        print("   - classification.txt")
-        print("   - workflow_summary.json")
+        save_result(store, audio_file_path, transcription, prompt, image_path,
+                    description, classification, fingerprint=fingerprint,
+                    duplicate_of=duplicate_of)
         
-        print_separator()
-        print(f"End Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print("✓ Customer complaint processed successfully!\n")
+        if save_files:
+            save_summary(transcription, prompt, image_path, description, classification)
         
-        # Return all results
         return {
             "transcription": transcription,
             "prompt": prompt,
             "image_path": image_path,
             "description": description,
-            "classification": classification
+            "classification": classification,
+            "duplicate_of": duplicate_of
         }
     
     except Exception as e:
@@ -178,12 +286,313 @@ def main(audio_file_path=None):
         return None
 
 
+def print_run_statistics(tier_stats):
+    """
+    Prints the prompt cache and dedup statistics of this run.
+    
+    Args:
+    tier_stats (dict): The run's model tier statistics, as returned by get_tier_stats().
+    """
+    for tier_name, stats in tier_stats.items():
+        print(f"✓ {tier_name} tier prompt cache hit ratio: {stats['cache_hit_ratio']:.0%}")
+    
+    dedup_stats = get_dedup_stats()
+    print(f"✓ Dedup hit rate: {dedup_stats['hits']}/{dedup_stats['lookups']} "
+          f"({dedup_stats['hit_rate']:.0%})")
+
+
+def main(audio_file_path=None):
+    """
+    Orchestrates the workflow for handling a single customer complaint.
+    
+    See process_complaint() for the workflow steps.
+    
+    Args:
+    audio_file_path (str): Path to the audio file. If None, will look for files in audio directory.
+    
+    Returns:
+    dict: A dictionary containing all results from the workflow.
+    """
+    os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    
+    print_separator("CUSTOMER COMPLAINT CLASSIFICATION SYSTEM")
+    print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
+    if audio_file_path is None:
+        # Use the oldest audio file in the audio directory
+        audio_file_path = next(discover_audio_files(config.AUDIO_DIR), None)
+        
+        if audio_file_path is None:
+            print("✗ No audio files found in the 'audio' directory.")
+            print("  Please place an audio file (.mp3, .wav, .m4a, or .ogg) in the 'audio' folder.")
+            return None
+    
+    if not os.path.exists(audio_file_path):
+        print(f"✗ Audio file not found: {audio_file_path}")
+        return None
+    
+    try:
+        with ResultsStore() as store:
+            result = process_complaint(store, audio_file_path)
+    finally:
+        # Saved even if the workflow failed, since the escalations, errors and cost of
+        # failed requests are needed to tune the thresholds
+        tier_stats = get_tier_stats()
+        save_tier_stats()
+    if result is None:
+        return None
+    
+    # Save complete summary
+    print_separator("WORKFLOW COMPLETE")
+    print(f"✓ Results appended to {config.RESULTS_DB}")
+    print_run_statistics(tier_stats)
+    
+    print("\n📁 Results saved in the 'output' directory:")
+    if config.SAVE_INTERMEDIATE_FILES:
+        print("   - transcription.txt")
+        print("   - image_prompt.txt")
+        print("   - generated_image.png")
+        print("   - image_description.txt")
+        print("   - annotated_image.png")
+        print("   - classification.json")
+        print("   - classification.txt")
+        print("   - workflow_summary.json")
+    print("   - results.db")
+    print("   - tier_stats.json")
+    
+    print_separator()
+    print(f"End Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("✓ Customer complaint processed successfully!\n")
+    
+    return result
+
+
+def process_batch_complaint(store, audio_file_path):
+    """
+    Runs the workflow for one file of a batch with its own working image file.
+    
+    Concurrent workers would otherwise overwrite each other's generated_image.png. The
+    working file is removed once the image has been copied into the blob store. The
+    shared per-run intermediate files and the annotated image are not written, since
+    workers would interleave them; every result is in the results store.
+    
+    Args:
+    store (ResultsStore): The store to look up duplicates in and append the result to.
+    audio_file_path (str): Path to the audio file.
+    
+    Returns:
+    dict: A dictionary containing all results from the workflow, or None if it failed.
+    """
+    work_dir = os.path.join(config.OUTPUT_DIR, "work")
+    os.makedirs(work_dir, exist_ok=True)
+    image_path = os.path.join(work_dir, f"{uuid.uuid4().hex}.png")
+    try:
+        return process_complaint(store, audio_file_path, image_path, save_files=False)
+    finally:
+        if os.path.exists(image_path):
+            os.remove(image_path)
+
+
+def print_concurrency_metrics():
+    """Prints each deployment's current concurrency limit and saves the metrics."""
+    for deployment, metrics in save_concurrency_metrics().items():
+        changes = ", ".join(f"{reason} {count}" for reason, count in metrics["changes"].items())
+        print(f"✓ {deployment}: limit {metrics['limit']}, {metrics['requests']} requests, "
+              f"{metrics['throttled']} throttled (limit changes: {changes})")
+
+
+def run_batch(audio_dir=None, limit=None, newest_first=False, warm_up_first=True, workers=None):
+    """
+    Processes every audio file under a directory tree as a stream.
+    
+    Files are discovered lazily and results are appended to the results store as they are
+    produced, so memory use stays constant regardless of the size of the backlog.
+    
+    Args:
+    audio_dir (str): The directory to process. Defaults to config.AUDIO_DIR.
+    limit (int): Stop after this many files.
+    newest_first (bool): Process the most recently modified files first.
+    warm_up_first (bool): Open the model tiers' connection before the first complaint.
+    workers (int): Files processed concurrently. Defaults to config.BATCH_WORKERS.
+    
+    Returns:
+    dict: The number of files processed successfully and the number that failed.
+    """
+    os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    audio_dir = audio_dir or config.AUDIO_DIR
+    workers = workers or config.BATCH_WORKERS
+    
+    print_separator("CUSTOMER COMPLAINT CLASSIFICATION SYSTEM - BATCH")
+    print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Audio directory: {audio_dir}")
+    print(f"Workers: {workers}\n")
+    
+    if warm_up_first:
+        from gpt import warm_up
+        warm_up()
+    
+    reset_dedup_stats()
+    audio_paths = discover_audio_files(audio_dir, newest_first)
+    if limit:
+        audio_paths = itertools.islice(audio_paths, limit)
+    
+    try:
+        with ResultsStore() as store:
+            counts = process_stream(audio_paths, process_batch_complaint, store, workers=workers)
+    finally:
+        tier_stats = get_tier_stats()
+        save_tier_stats()
+    
+    print_separator("BATCH COMPLETE")
+    print(f"✓ {counts['processed']} complaints processed, {counts['failed']} failed")
+    print(f"✓ Results appended to {config.RESULTS_DB}")
+    print_run_statistics(tier_stats)
+    print_concurrency_metrics()
+    
+    print_separator()
+    print(f"End Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    return counts
+
+
+def show_results(category=None, subcategory=None, since=None, until=None, limit=20):
+    """
+    Prints stored results from the results store, newest first.
+    
+    Args:
+    category (str): Only show results in this category.
+    subcategory (str): Only show results in this subcategory.
+    since (str): ISO date or timestamp; only results created at or after it.
+    until (str): ISO date or timestamp; only results created before it.
+    limit (int): Maximum number of results to show.
+    """
+    if not os.path.exists(config.RESULTS_DB):
+        print("No results stored yet.")
+        return
+    
+    with ResultsStore(read_only=True) as store:
+        results = store.query(category, subcategory, since, until, limit)
+    
+    if not results:
+        print("No stored results match the given filters.")
+        return
+    
+    for result in results:
+        duplicate = f" (duplicate of #{result['duplicate_of']})" if result["duplicate_of"] else ""
+        print(f"#{result['id']}  {result['created_at'][:19]}  "
+              f"{result['category']} / {result['subcategory']}{duplicate}")
+        print(f"    {result['audio_path']}")
+
+
+def show_stats(since=None, until=None):
+    """
+    Prints the number of stored results per category and the model tier statistics.
+    
+    Args:
+    since (str): ISO date or timestamp; only count results created at or after it.
+    until (str): ISO date or timestamp; only count results created before it.
+    """
+    print_separator("RESULTS PER CATEGORY")
+    if not os.path.exists(config.RESULTS_DB):
+        print("  No results stored yet.")
+    else:
+        with ResultsStore(read_only=True) as store:
+            for category, subcategory, count in store.count_by_category(since, until):
+                print(f"  {count:>8}  {category} / {subcategory}")
+    
+    print_separator("MODEL TIER STATISTICS")
+    if not os.path.exists(config.TIER_STATS_FILE):
+        print("  No model tier statistics recorded yet.")
+        return
+    with open(config.TIER_STATS_FILE, "r", encoding="utf-8") as f:
+        tier_stats = json.load(f)
+    for tier_name, stats in tier_stats.items():
+        print(f"  {tier_name}: {stats['requests']} requests, {stats['accepted']} accepted, "
+              f"escalation rate {stats['escalation_rate']:.0%}, "
+              f"prompt cache hit ratio {stats.get('cache_hit_ratio', 0.0):.0%}, "
+              f"avg latency {stats['avg_latency']:.2f}s, total cost ${stats['total_cost']:.4f}")
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line arguments.
+    
+    Without a subcommand the arguments are treated as `run`, so `python main.py [audio_file]`
+    keeps working.
+    
+    Args:
+    argv (list): The arguments to parse. Defaults to sys.argv[1:].
+    
+    Returns:
+    argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Customer complaint classification system"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    
+    run_parser = subparsers.add_parser("run", help="process one audio complaint (default)")
+    run_parser.add_argument("audio_file", nargs="?",
+                            help="path to the audio file (default: first file in the audio directory)")
+    
+    batch_parser = subparsers.add_parser("batch", help="process every audio file under a directory tree")
+    batch_parser.add_argument("audio_dir", nargs="?",
+                              help="directory to process (default: the audio directory)")
+    batch_parser.add_argument("--limit", type=int, help="stop after this many files")
+    batch_parser.add_argument("--newest-first", action="store_true",
+                              help="process the most recently modified files first")
+    batch_parser.add_argument("--workers", type=int,
+                              help="files processed concurrently (default: BATCH_WORKERS in config.py)")
+    batch_parser.add_argument("--no-warm-up", action="store_true",
+                              help="skip warming up the model tiers before the batch")
+    
+    query_parser = subparsers.add_parser("query", help="list stored results")
+    query_parser.add_argument("--category", help="only results in this category")
+    query_parser.add_argument("--subcategory", help="only results in this subcategory")
+    query_parser.add_argument("--since", help="only results created at or after this ISO date")
+    query_parser.add_argument("--until", help="only results created before this ISO date")
+    query_parser.add_argument("--limit", type=int, default=20, help="maximum results to show (default: 20)")
+    
+    stats_parser = subparsers.add_parser("stats", help="show results per category and model tier statistics")
+    stats_parser.add_argument("--since", help="only count results created at or after this ISO date")
+    stats_parser.add_argument("--until", help="only count results created before this ISO date")
+    
+    subparsers.add_parser("warm-up", help="check that every model tier responds")
+    
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0] not in subparsers.choices and argv[0] not in ("-h", "--help")):
+        argv = ["run"] + argv
+    return parser.parse_args(argv)
+
+
+def cli(argv=None):
+    """
+    Runs the command selected on the command line.
+    
+    Args:
+    argv (list): The arguments to parse. Defaults to sys.argv[1:].
+    
+    Returns:
+    int: The process exit code.
+    """
+    args = parse_args(argv)
+    
+    if args.command == "batch":
+        counts = run_batch(args.audio_dir, args.limit, args.newest_first, not args.no_warm_up,
+                           args.workers)
+        return 1 if counts["failed"] else 0
+    elif args.command == "query":
+        show_results(args.category, args.subcategory, args.since, args.until, args.limit)
+    elif args.command == "stats":
+        show_stats(args.since, args.until)
+    elif args.command == "warm-up":
+        from gpt import warm_up
+        return 0 if warm_up() else 1
+    else:
+        return 0 if main(args.audio_file) else 1
+    return 0
+
+
 # Example Usage
 if __name__ == "__main__":
-    # Check if an audio file path was provided as command line argument
-    if len(sys.argv) > 1:
-        audio_path = sys.argv[1]
-        main(audio_path)
-    else:
-        # Run with default audio file search
-        main()
+    sys.exit(cli())
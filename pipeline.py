@@ -0,0 +1,122 @@
+# pipeline.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import config
+
+# Streaming batch processing: audio files are discovered lazily and processed as a bounded
+# stream, with results flushed to the results store as they are produced, so memory use doesn't
+# grow with the size of the backlog
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.ogg')
+
+
+def discover_audio_files(root=None, newest_first=False):
+    """
+    Yields the audio files under a directory tree, one at a time, oldest first.
+
+    Within each directory, audio files are ordered by modification time and come before
+    the subdirectories, which are visited in name order. Date-named folders (e.g.
+    2025/01/31) therefore come out in date order, whatever their own mtimes are; a
+    folder's mtime changes whenever a file is added to it.
+
+    Memory is bounded by the largest single directory rather than the whole tree: the
+    names and mtimes of one directory's audio files (roughly 150 bytes per file) are
+    held while it is walked, plus the subdirectory names of each enclosing directory.
+
+    Args:
+    root (str): The directory to search. Defaults to config.AUDIO_DIR.
+    newest_first (bool): Reverse the order: subdirectories in reverse name order first,
+        then the directory's own files, newest first.
+
+    Yields:
+    str: The path of each audio file.
+    """
+    root = root or config.AUDIO_DIR
+    files = []
+    subdirectories = []
+    try:
+        with os.scandir(root) as iterator:
+            for entry in iterator:
+                if entry.name.startswith('.'):
+                    continue
+                # A dangling symlink or a file removed since the listing only skips that entry;
+                # symlinked directories are not followed, so links can't form a loop
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.name)
+                    elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                        files.append((entry.stat().st_mtime, entry.name))
+                except OSError as e:
+                    print(f"✗ Skipping {entry.path}: {str(e)}")
+    except (FileNotFoundError, NotADirectoryError, PermissionError) as e:
+        print(f"✗ Cannot read directory {root}: {str(e)}")
+        return
+
+    files.sort(reverse=newest_first)
+    subdirectories.sort(reverse=newest_first)
+    file_paths = (os.path.join(root, name) for _, name in files)
+    subdirectory_paths = (path for name in subdirectories
+                          for path in discover_audio_files(os.path.join(root, name), newest_first))
+    if newest_first:
+        yield from subdirectory_paths
+        yield from file_paths
+    else:
+        yield from file_paths
+        yield from subdirectory_paths
+
+
+def _process_one(process, store, audio_path):
+    """Runs the process callback for one file, turning exceptions into a failure."""
+    try:
+        return bool(process(store, audio_path))
+    except Exception as e:
+        print(f"✗ Error processing {audio_path}: {str(e)}")
+        return False
+
+
+def process_stream(audio_paths, process, store, progress_every=100, workers=1):
+    """
+    Processes audio files and appends their results to the store.
+
+    Results are not kept in memory; each one is handed to the store, which commits them
+    in batches of config.RESULTS_BATCH_SIZE. With several workers, at most two files per
+    worker are pulled from audio_paths ahead of time, so memory stays bounded. The actual
+    number of API calls in flight is set by each deployment's adaptive limiter.
+
+    Args:
+    audio_paths (iterable): The audio files to process, e.g. from discover_audio_files().
+    process (callable): Takes (store, audio_path), appends the result to the store and
+        returns a truthy value on success.
+    store (ResultsStore): The store results are appended to.
+    progress_every (int): Print a progress line every this many files.
+    workers (int): Number of files processed concurrently.
+
+    Returns:
+    dict: The number of files processed successfully and the number that failed.
+    """
+    counts = {"processed": 0, "failed": 0}
+
+    def record(succeeded):
+        counts["processed" if succeeded else "failed"] += 1
+        finished = counts["processed"] + counts["failed"]
+        if progress_every and finished % progress_every == 0:
+            print(f"  ... {finished} files ({counts['failed']} failed)")
+
+    if workers <= 1:
+        for audio_path in audio_paths:
+            record(_process_one(process, store, audio_path))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for audio_path in audio_paths:
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(future.result())
+                pending.add(executor.submit(_process_one, process, store, audio_path))
+            for future in pending:
+                record(future.result())
+
+    store.commit()
+    return counts
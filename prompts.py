@@ -0,0 +1,124 @@
+# prompts.py
+
+import json
+from functools import lru_cache
+import config
+
+# Prompt templates for the GPT-4o calls
+# Static content (instructions and the category taxonomy) is built once and always sent
+# first, so repeated requests share an identical prefix, with the variable complaint
+# content appended at the end. The service only caches prompts of 1024 tokens or more
+# (see classification_system_prompt for the current size).
+
+CLASSIFICATION_INSTRUCTIONS = """You are an expert customer service classifier. Your task is to categorize customer complaints into the appropriate category and subcategory based on the complaint details.
+
+You will be provided with:
+1. The customer's original complaint (transcribed from audio)
+2. A description of an image representing the issue
+
+Analyze the information carefully and classify the complaint into the most appropriate category and subcategory pair from the list below.
+
+Determine:
+1. The most appropriate CATEGORY
+2. The most appropriate SUBCATEGORY within that category
+3. A brief explanation of why this classification was chosen
+4. How confident you are in this classification, from 0.0 (guessing) to 1.0 (certain)
+
+Respond in the following JSON format:
+{
+    "category": "Category Name",
+    "subcategory": "Subcategory Name",
+    "reasoning": "Brief explanation of the classification",
+    "confidence": 0.0
+}
+
+AVAILABLE CATEGORIES AND SUBCATEGORIES:
+"""
+
+CLASSIFICATION_TEMPLATE = """CUSTOMER COMPLAINT:
+{transcription}
+
+IMAGE DESCRIPTION:
+{image_description}"""
+
+DESCRIPTION_SYSTEM_PROMPT = (
+    "You are an expert at analyzing product images and identifying defects, issues, or problems. "
+    "Provide a detailed description of what you see in the image, focusing on any issues, damages, "
+    "or problems visible. Respond in JSON with a \"description\" field and a \"confidence\" field "
+    "from 0.0 (unclear image) to 1.0 (issue clearly visible)."
+)
+
+DESCRIPTION_USER_TEXT = (
+    "Please describe this image in detail, focusing on any visible issues, problems, or defects. "
+    "What product is shown? What is wrong with it?"
+)
+
+
+@lru_cache(maxsize=1)
+def load_categories():
+    """
+    Loads the category catalogue once per process.
+
+    Returns:
+    dict: The available categories mapped to their subcategories.
+    """
+    with open(config.CATEGORIES_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=1)
+def classification_system_prompt():
+    """
+    Builds the static classification prompt: instructions followed by the taxonomy.
+
+    With the shipped categories.json this is 1,004 tokens (o200k_base, the GPT-4o
+    tokenizer), below Azure's 1024-token minimum for prompt caching, so the first 1024
+    tokens of each request include complaint text and cached_tokens stays 0. Caching
+    only starts if the instructions or taxonomy grow past that minimum.
+
+    Returns:
+    str: The system prompt shared by every classification request.
+    """
+    return CLASSIFICATION_INSTRUCTIONS + json.dumps(load_categories(), indent=2)
+
+
+def build_classification_messages(transcription, image_description):
+    """
+    Builds the chat messages for a classification request.
+
+    Args:
+    transcription (str): The transcribed text of the customer complaint.
+    image_description (str): The description of the generated image.
+
+    Returns:
+    list: The static system message followed by the complaint-specific user message.
+    """
+    return [
+        {"role": "system", "content": classification_system_prompt()},
+        {"role": "user", "content": CLASSIFICATION_TEMPLATE.format(
+            transcription=transcription,
+            image_description=image_description
+        )}
+    ]
+
+
+def build_description_messages(image_data):
+    """
+    Builds the chat messages for an image description request.
+
+    Args:
+    image_data (str): The base64-encoded PNG image.
+
+    Returns:
+    list: The static system message and instructions followed by the image.
+    """
+    return [
+        {"role": "system", "content": DESCRIPTION_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": DESCRIPTION_USER_TEXT},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_data}"}}
+            ]
+        }
+    ]
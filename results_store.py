@@ -0,0 +1,339 @@
+# results_store.py
+
+import os
+import shutil
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+import config
+from dedup import BAND_COUNT, fingerprint_bands, pack_fingerprint, unpack_fingerprint
+
+# Compact results sink: one SQLite row per complaint, images in a content-addressed blob directory
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS complaints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    audio_path TEXT,
+    transcription TEXT,
+    image_prompt TEXT,
+    image_sha256 TEXT,
+    description TEXT,
+    category TEXT,
+    subcategory TEXT,
+    reasoning TEXT,
+    confidence REAL,
+    model_tier TEXT,
+    fingerprint BLOB,
+    fp_band0 INTEGER,
+    fp_band1 INTEGER,
+    fp_band2 INTEGER,
+    fp_band3 INTEGER,
+    fp_band4 INTEGER,
+    fp_band5 INTEGER,
+    fp_band6 INTEGER,
+    fp_band7 INTEGER,
+    duplicate_of INTEGER
+);
+"""
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_complaints_category
+    ON complaints (category, subcategory, created_at);
+CREATE INDEX IF NOT EXISTS idx_complaints_created_at
+    ON complaints (created_at);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band0 ON complaints (fp_band0);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band1 ON complaints (fp_band1);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band2 ON complaints (fp_band2);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band3 ON complaints (fp_band3);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band4 ON complaints (fp_band4);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band5 ON complaints (fp_band5);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band6 ON complaints (fp_band6);
+CREATE INDEX IF NOT EXISTS idx_complaints_fp_band7 ON complaints (fp_band7);
+"""
+
+# Columns added after the first release, with their types, for upgrading existing databases
+_ADDED_COLUMNS = {
+    "fingerprint": "BLOB",
+    "fp_band0": "INTEGER",
+    "fp_band1": "INTEGER",
+    "fp_band2": "INTEGER",
+    "fp_band3": "INTEGER",
+    "fp_band4": "INTEGER",
+    "fp_band5": "INTEGER",
+    "fp_band6": "INTEGER",
+    "fp_band7": "INTEGER",
+    "duplicate_of": "INTEGER",
+}
+
+_COLUMNS = (
+    "created_at",
+    "audio_path",
+    "transcription",
+    "image_prompt",
+    "image_sha256",
+    "description",
+    "category",
+    "subcategory",
+    "reasoning",
+    "confidence",
+    "model_tier",
+    "fingerprint",
+    "fp_band0",
+    "fp_band1",
+    "fp_band2",
+    "fp_band3",
+    "fp_band4",
+    "fp_band5",
+    "fp_band6",
+    "fp_band7",
+    "duplicate_of",
+)
+
+
+def _row_to_dict(row):
+    """Converts a database row to a result dict with a decoded fingerprint."""
+    result = dict(row)
+    if result.get("fingerprint") is not None:
+        result["fingerprint"] = unpack_fingerprint(result["fingerprint"])
+    return result
+
+
+class ResultsStore:
+    """
+    Appends workflow results to a SQLite table and stores images by content hash.
+
+    Records are buffered and written in a single transaction every `batch_size` records,
+    or when commit() or close() is called. Use as a context manager to make sure the
+    last partial batch is written. A store can be shared by the threads of a batch run.
+    """
+
+    def __init__(self, db_path=None, blob_dir=None, batch_size=None, read_only=False):
+        """
+        Opens (and creates if needed) the results database and blob directory.
+
+        Args:
+        db_path (str): Path to the SQLite database. Defaults to config.RESULTS_DB.
+        blob_dir (str): Directory for content-addressed images. Defaults to config.BLOB_DIR.
+        batch_size (int): Records buffered per transaction. Defaults to config.RESULTS_BATCH_SIZE.
+        read_only (bool): Open an existing database for queries only, without creating
+            or upgrading anything. Raises sqlite3.OperationalError if it doesn't exist.
+        """
+        self.db_path = db_path or config.RESULTS_DB
+        self.blob_dir = blob_dir or config.BLOB_DIR
+        self.batch_size = batch_size or config.RESULTS_BATCH_SIZE
+        self._pending = []
+        self._pending_bands = set()
+        self._lock = threading.RLock()
+
+        if read_only:
+            self.connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                              check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            return
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+        existing_columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(complaints)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in existing_columns:
+                self.connection.execute(f"ALTER TABLE complaints ADD COLUMN {column} {column_type}")
+        self.connection.executescript(_INDEXES)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def blob_path(self, digest):
+        """
+        Returns the path of a stored blob, fanned out by the first two hex digits.
+
+        Args:
+        digest (str): The SHA-256 hex digest of the blob.
+
+        Returns:
+        str: The path to the blob file.
+        """
+        return os.path.join(self.blob_dir, digest[:2], digest + ".png")
+
+    def store_blob(self, file_path):
+        """
+        Copies a file into the blob directory under its content hash.
+
+        Identical images are stored once; storing an existing blob is a no-op.
+
+        Args:
+        file_path (str): Path to the file to store.
+
+        Returns:
+        str: The SHA-256 hex digest identifying the blob.
+        """
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        target_path = self.blob_path(digest)
+        if not os.path.exists(target_path):
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            temp_path = f"{target_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(file_path, temp_path)
+            os.replace(temp_path, target_path)
+        return digest
+
+    def add(self, record):
+        """
+        Buffers one workflow result, committing when the batch is full.
+
+        Args:
+        record (dict): Result fields keyed by column name. Missing fields are stored as NULL
+            and created_at defaults to the current time. A "fingerprint" is indexed by band
+            for near-duplicate lookups, unless the record is itself a duplicate_of another one.
+        """
+        record = dict(record)
+        record.setdefault("created_at", datetime.now().isoformat())
+        bands = []
+        if record.get("fingerprint") is not None:
+            # Only representatives are indexed, so a cluster of repeated complaints
+            # stays a single lookup candidate however large it grows
+            if record.get("duplicate_of") is None:
+                bands = list(enumerate(fingerprint_bands(record["fingerprint"])))
+                for band, value in bands:
+                    record[f"fp_band{band}"] = value
+            record["fingerprint"] = pack_fingerprint(record["fingerprint"])
+        with self._lock:
+            self._pending.append(tuple(record.get(column) for column in _COLUMNS))
+            self._pending_bands.update(bands)
+            if len(self._pending) >= self.batch_size:
+                self.commit()
+
+    def commit(self):
+        """Writes all buffered records in a single transaction."""
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with self._lock:
+            if not self._pending:
+                return
+            with self.connection:
+                self.connection.executemany(
+                    f"INSERT INTO complaints ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                    self._pending
+                )
+            self._pending = []
+            self._pending_bands.clear()
+
+    def query(self, category=None, subcategory=None, since=None, until=None, limit=None):
+        """
+        Returns stored results matching the given filters, newest first.
+
+        Buffered records are committed first so they are included in the results.
+
+        Args:
+        category (str): Only return results in this category.
+        subcategory (str): Only return results in this subcategory.
+        since (str): ISO date or timestamp; only results created at or after it.
+        until (str): ISO date or timestamp; only results created before it.
+        limit (int): Maximum number of results to return.
+
+        Returns:
+        list: A list of result dicts.
+        """
+        where, params = self._filters(category, subcategory, since, until)
+        sql = f"SELECT * FROM complaints{where} ORDER BY created_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            self.commit()
+            return [_row_to_dict(row) for row in self.connection.execute(sql, params)]
+
+    def get(self, result_id):
+        """
+        Returns one stored result.
+
+        Args:
+        result_id (int): The id of the result.
+
+        Returns:
+        dict: The result, or None if there is no result with that id.
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT * FROM complaints WHERE id = ?", (result_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def find_by_fingerprint_bands(self, bands):
+        """
+        Returns the fingerprints of stored representative results sharing at least one band.
+
+        Duplicates are not indexed, so each group of near-duplicates has one candidate.
+        Buffered records are only committed when one of them shares a band, so lookups
+        don't break up the batched transactions.
+
+        Args:
+        bands (list): The fingerprint bands of the complaint being looked up.
+
+        Returns:
+        list: (id, fingerprint) tuples; callers compare the fingerprints and get() the match.
+        """
+        conditions = " OR ".join(f"fp_band{band} = ?" for band in range(BAND_COUNT))
+        sql = f"SELECT id, fingerprint FROM complaints WHERE duplicate_of IS NULL AND ({conditions})"
+        with self._lock:
+            if not self._pending_bands.isdisjoint(enumerate(bands)):
+                self.commit()
+            return [(row["id"], unpack_fingerprint(row["fingerprint"]))
+                    for row in self.connection.execute(sql, list(bands))]
+
+    def count_by_category(self, since=None, until=None):
+        """
+        Counts stored results per category/subcategory pair for reporting.
+
+        Args:
+        since (str): ISO date or timestamp; only results created at or after it.
+        until (str): ISO date or timestamp; only results created before it.
+
+        Returns:
+        list: (category, subcategory, count) tuples ordered by count, highest first.
+        """
+        where, params = self._filters(None, None, since, until)
+        sql = (f"SELECT category, subcategory, COUNT(*) FROM complaints{where} "
+               "GROUP BY category, subcategory ORDER BY COUNT(*) DESC")
+        with self._lock:
+            self.commit()
+            return [tuple(row) for row in self.connection.execute(sql, params)]
+
+    def close(self):
+        """Commits any buffered records and closes the database."""
+        with self._lock:
+            self.commit()
+            self.connection.close()
+
+    @staticmethod
+    def _filters(category, subcategory, since, until):
+        """Builds the WHERE clause and parameters shared by the query methods."""
+        conditions = []
+        params = []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if subcategory:
+            conditions.append("subcategory = ?")
+            params.append(subcategory)
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("created_at < ?")
+            params.append(until)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
@@ -0,0 +1,279 @@
+# router.py
+
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+from functools import lru_cache
+import config
+from concurrency import call_with_retries, is_throttled
+
+# Model tiering: send requests to the cheaper deployment first and escalate
+# to the larger one only when confidence is low or validation fails
+
+_STAT_FIELDS = (
+    "requests",
+    "accepted",
+    "escalations",
+    "low_confidence",
+    "validation_failures",
+    "errors",
+    "prompt_tokens",
+    "cached_tokens",
+    "completion_tokens",
+    "total_latency",
+    "total_cost",
+)
+
+_tier_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _count(tier_name, **amounts):
+    """Adds the given amounts to a tier's statistics, creating them if needed."""
+    with _stats_lock:
+        if tier_name not in _tier_stats:
+            _tier_stats[tier_name] = {field: 0 for field in _STAT_FIELDS}
+        for field, amount in amounts.items():
+            _tier_stats[tier_name][field] += amount
+
+
+def _record_usage(tier, response, latency):
+    """Adds latency, token usage and estimated cost of a response to a tier's statistics."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    prompt_details = getattr(usage, "prompt_tokens_details", None)
+    _count(
+        tier["name"],
+        total_latency=latency,
+        prompt_tokens=prompt_tokens,
+        cached_tokens=getattr(prompt_details, "cached_tokens", 0) or 0,
+        completion_tokens=completion_tokens,
+        total_cost=(prompt_tokens / 1000 * tier.get("input_cost_per_1k", 0)
+                    + completion_tokens / 1000 * tier.get("output_cost_per_1k", 0))
+    )
+
+
+@lru_cache(maxsize=1)
+def get_chat_client():
+    """
+    Returns the Azure OpenAI client shared by the chat completion calls.
+
+    The client is created once per process so its connection pool is reused across
+    requests instead of opening a new connection for every call. Its own retries are
+    disabled; calls are retried by concurrency.call_with_retries, outside the limiter slot.
+
+    Returns:
+    AzureOpenAI: The client for the GPT-4o endpoint.
+    """
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(
+        api_key=config.AZURE_OPENAI_API_KEY,
+        api_version=config.GPT4O_API_VERSION,
+        azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+        max_retries=0
+    )
+
+
+def parse_confidence(data):
+    """
+    Extracts the self-reported confidence from a parsed model response.
+
+    Args:
+    data (dict): The parsed JSON response containing a "confidence" field.
+
+    Returns:
+    float: The confidence clamped to the range 0.0 - 1.0.
+    """
+    confidence = float(data["confidence"])
+    # json.loads accepts NaN and Infinity; NaN would pass any threshold comparison
+    if not math.isfinite(confidence):
+        raise ValueError(f"confidence is not a finite number: {data['confidence']}")
+    return min(max(confidence, 0.0), 1.0)
+
+
+def route_completion(client, messages, parse_response, operation="chat", **create_kwargs):
+    """
+    Sends a chat completion through the configured model tiers.
+
+    Each tier in config.MODEL_TIERS is tried in order. A response is accepted when
+    it passes validation and its self-reported confidence meets
+    config.CONFIDENCE_THRESHOLD; otherwise the request escalates to the next tier.
+    The last tier's answer is always accepted if it passes validation. Failed calls are
+    retried on the same tier first; a request still throttled (429) after its retries is
+    raised instead of escalated, so load backs off rather than moving to the more
+    expensive deployment.
+
+    Args:
+    client (AzureOpenAI): The client used to call the deployments.
+    messages (list): The chat messages to send.
+    parse_response (callable): Takes the response text and returns a (result, confidence)
+        tuple. Raises ValueError, KeyError or TypeError if the response is invalid.
+    operation (str): The kind of request, e.g. "classification"; each deployment's
+        limiter keeps a separate latency baseline per operation.
+    **create_kwargs: Extra arguments passed to client.chat.completions.create.
+
+    Returns:
+    tuple: The parsed result, its confidence and the name of the tier that produced it.
+    """
+    tiers = config.MODEL_TIERS
+
+    for index, tier in enumerate(tiers):
+        is_last_tier = index == len(tiers) - 1
+        tier_name = tier["name"]
+
+        _count(tier_name, requests=1)
+        try:
+            start = time.perf_counter()
+            response = call_with_retries(
+                tier["deployment"],
+                lambda: client.chat.completions.create(
+                    model=tier["deployment"],
+                    messages=messages,
+                    **create_kwargs
+                ),
+                operation
+            )
+        except Exception as e:
+            _count(tier_name, errors=1)
+            if is_last_tier or is_throttled(e):
+                raise
+            _count(tier_name, escalations=1)
+            print(f"  ↑ {tier_name} tier request failed ({e}), escalating")
+            continue
+        _record_usage(tier, response, time.perf_counter() - start)
+
+        try:
+            result, confidence = parse_response(response.choices[0].message.content)
+        except (ValueError, KeyError, TypeError) as e:
+            _count(tier_name, validation_failures=1)
+            if is_last_tier:
+                raise ValueError(f"Invalid response from {tier_name} tier: {e}") from e
+            _count(tier_name, escalations=1)
+            print(f"  ↑ {tier_name} tier response failed validation ({e}), escalating")
+            continue
+
+        if confidence < config.CONFIDENCE_THRESHOLD and not is_last_tier:
+            _count(tier_name, low_confidence=1, escalations=1)
+            print(f"  ↑ {tier_name} tier confidence {confidence:.2f} below "
+                  f"{config.CONFIDENCE_THRESHOLD:.2f}, escalating")
+            continue
+
+        _count(tier_name, accepted=1)
+        return result, confidence, tier["name"]
+
+    raise RuntimeError("No model tiers configured in config.MODEL_TIERS")
+
+
+def _build_report(tier_stats):
+    """Adds the derived averages and ratios to per-tier counters."""
+    report = {}
+    for tier_name, stats in tier_stats.items():
+        requests = stats["requests"]
+        report[tier_name] = dict(stats)
+        report[tier_name]["avg_latency"] = stats["total_latency"] / requests if requests else 0.0
+        report[tier_name]["avg_cost"] = stats["total_cost"] / requests if requests else 0.0
+        report[tier_name]["escalation_rate"] = stats["escalations"] / requests if requests else 0.0
+        report[tier_name]["cache_hit_ratio"] = (
+            stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        )
+    return report
+
+
+def get_tier_stats():
+    """
+    Returns the statistics recorded for each tier in this process.
+
+    Returns:
+    dict: Per-tier counters plus derived average latency, average cost, escalation rate
+    and prompt cache hit ratio (cached prompt tokens / prompt tokens).
+    """
+    with _stats_lock:
+        tier_stats = {tier_name: dict(stats) for tier_name, stats in _tier_stats.items()}
+    return _build_report(tier_stats)
+
+
+def _load_stats_file():
+    """Reads the counters of an existing TIER_STATS_FILE, or {} if it is missing or unreadable."""
+    try:
+        with open(config.TIER_STATS_FILE, "r", encoding="utf-8") as f:
+            return {name: {field: data.get(field, 0) for field in _STAT_FIELDS}
+                    for name, data in json.load(f).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def save_tier_stats():
+    """
+    Adds this process's tier statistics to the cumulative totals and writes the report.
+
+    The totals are kept in a tier_stats table in config.RESULTS_DB and updated in a single
+    transaction, so overlapping runs (e.g. one per file from cron) don't lose updates. The
+    report in config.TIER_STATS_FILE is replaced atomically while that transaction holds
+    the database's write lock. Counters accumulate across runs so thresholds can be tuned
+    from the combined data. In-memory statistics are reset after saving.
+
+    A failure is reported but not raised, so it never aborts a run.
+
+    Returns:
+    dict: The cumulative report that was written, or None if saving failed.
+    """
+    with _stats_lock:
+        run_stats = {tier_name: dict(stats) for tier_name, stats in _tier_stats.items()}
+        _tier_stats.clear()
+
+    try:
+        db_dir = os.path.dirname(config.RESULTS_DB)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        connection = sqlite3.connect(config.RESULTS_DB, timeout=30, isolation_level=None)
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tier_stats ("
+                "tier TEXT NOT NULL, field TEXT NOT NULL, value NUMERIC NOT NULL, "
+                "PRIMARY KEY (tier, field))"
+            )
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                additions = [run_stats]
+                # Start from the totals of a report written before the table existed
+                if connection.execute("SELECT COUNT(*) FROM tier_stats").fetchone()[0] == 0:
+                    additions.append(_load_stats_file())
+
+                connection.executemany(
+                    "INSERT INTO tier_stats (tier, field, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (tier, field) DO UPDATE SET value = value + excluded.value",
+                    [(tier_name, field, stats[field])
+                     for tier_stats in additions
+                     for tier_name, stats in tier_stats.items()
+                     for field in _STAT_FIELDS]
+                )
+
+                totals = {}
+                for tier_name, field, value in connection.execute("SELECT tier, field, value FROM tier_stats"):
+                    totals.setdefault(tier_name, {name: 0 for name in _STAT_FIELDS})[field] = value
+                report = _build_report(totals)
+
+                temp_path = f"{config.TIER_STATS_FILE}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=2)
+                os.replace(temp_path, config.TIER_STATS_FILE)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+    except Exception as e:
+        # Keep the counters in memory so a later save can still record them
+        for tier_name, stats in run_stats.items():
+            _count(tier_name, **stats)
+        print(f"✗ Could not save model tier statistics: {str(e)}")
+        return None
+
+    print(f"✓ Model tier statistics saved to {config.TIER_STATS_FILE}")
+    return report
@@ -0,0 +1,211 @@
+"""
+Tests for the adaptive concurrency limiter
+Runs the limiter against a mock deployment that slows down and throttles under load
+"""
+
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("config", reason="config.py not found - copy config.example.py to config.py")
+
+import concurrency
+from concurrency import AdaptiveLimiter, call_with_retries, is_throttled
+
+
+class MockThrottled(Exception):
+    """Mock of an API error for an HTTP 429 response."""
+    status_code = 429
+
+
+class DegradingService:
+    """
+    Mock deployment that handles `capacity` concurrent requests at full speed.
+
+    Beyond that, latency grows in proportion to the load, and above three times the
+    capacity requests are rejected with HTTP 429.
+    """
+
+    def __init__(self, capacity, base_latency):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+            load = self.in_flight
+            if load > self.capacity * 3:
+                self.throttled += 1
+        try:
+            if load > self.capacity * 3:
+                raise MockThrottled("429 Too Many Requests")
+            time.sleep(self.base_latency * max(1.0, load / self.capacity))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def run_clients(service, limiter, clients, calls_per_client):
+    """Calls the service from several threads, through the limiter if one is given."""
+    def client():
+        for _ in range(calls_per_client):
+            try:
+                if limiter is None:
+                    service.call()
+                else:
+                    with limiter:
+                        service.call()
+            except MockThrottled:
+                pass
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_throttling_cuts_the_limit_and_records_the_reason():
+    limiter = AdaptiveLimiter("mock", initial_limit=8, min_limit=1, max_limit=32,
+                              latency_tolerance=2.0, decrease_factor=0.5)
+    with pytest.raises(MockThrottled):
+        with limiter:
+            raise MockThrottled()
+
+    metrics = limiter.metrics()
+    assert metrics["limit"] == 4
+    assert metrics["throttled"] == 1
+    assert metrics["changes"]["throttled"] == 1
+    assert metrics["recent_changes"][-1]["reason"] == "throttled"
+
+
+def test_other_errors_do_not_change_the_limit():
+    limiter = AdaptiveLimiter("mock", initial_limit=8)
+    with pytest.raises(ValueError):
+        with limiter:
+            raise ValueError("invalid response")
+
+    assert limiter.metrics()["limit"] == 8
+    assert limiter.metrics()["errors"] == 1
+
+
+def test_is_throttled_detects_requests_style_errors():
+    class Response:
+        status_code = 429
+
+    class HTTPError(Exception):
+        response = Response()
+
+    assert is_throttled(HTTPError())
+    assert is_throttled(MockThrottled())
+    assert not is_throttled(RuntimeError())
+
+
+def test_limit_converges_near_the_capacity_of_a_degrading_service():
+    capacity = 8
+    limiter = AdaptiveLimiter("mock", initial_limit=2, min_limit=1, max_limit=64,
+                              latency_tolerance=2.0, decrease_factor=0.5)
+    limited_service = DegradingService(capacity, base_latency=0.01)
+    run_clients(limited_service, limiter, clients=32, calls_per_client=40)
+
+    unlimited_service = DegradingService(capacity, base_latency=0.01)
+    run_clients(unlimited_service, None, clients=32, calls_per_client=10)
+
+    metrics = limiter.metrics()
+    assert metrics["changes"]["increase"] > 0
+    assert metrics["changes"]["latency"] + metrics["changes"]["throttled"] > 0
+    assert capacity // 2 <= metrics["limit"] <= capacity * 3
+    assert limited_service.throttled / limited_service.calls < 0.05
+    assert unlimited_service.throttled / unlimited_service.calls > 0.2
+
+
+def test_throttled_requests_are_not_escalated(monkeypatch):
+    import config
+    from router import route_completion
+
+    deployments = []
+
+    class Completions:
+        def create(self, model, messages, **kwargs):
+            deployments.append(model)
+            raise MockThrottled("429 Too Many Requests")
+
+    class Client:
+        class chat:
+            completions = Completions()
+
+    monkeypatch.setattr(config, "MODEL_TIERS", [
+        {"name": "small", "deployment": "mock-small"},
+        {"name": "large", "deployment": "mock-large"}
+    ])
+    monkeypatch.setattr(concurrency, "_RETRY_BASE_DELAY", 0)
+    with pytest.raises(MockThrottled):
+        route_completion(Client(), [], lambda text: (text, 1.0))
+    assert deployments == ["mock-small"] * concurrency._MAX_ATTEMPTS
+
+
+def test_throttled_calls_are_retried_after_retry_after(monkeypatch):
+    class Response:
+        status_code = 429
+        headers = {"retry-after-ms": "20"}
+
+    class HTTPError(Exception):
+        response = Response()
+
+    attempts = []
+    sleeps = []
+    monkeypatch.setattr(concurrency.time, "sleep", sleeps.append)
+
+    def call():
+        attempts.append(concurrency.get_limiter("mock-retry").metrics()["in_flight"])
+        if len(attempts) == 1:
+            raise HTTPError("429 Too Many Requests")
+        return "ok"
+
+    assert call_with_retries("mock-retry", call) == "ok"
+    assert sleeps == [pytest.approx(0.02)]
+    # Each attempt holds a slot, and the throttled attempt cut the limit
+    assert attempts == [1, 1]
+    assert concurrency.get_limiter("mock-retry").metrics()["changes"]["throttled"] == 1
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise ValueError("Bad request")
+
+    with pytest.raises(ValueError):
+        call_with_retries("mock-no-retry", call)
+    assert len(attempts) == 1
+
+
+def test_latency_baselines_are_kept_per_operation():
+    limiter = AdaptiveLimiter("mock", initial_limit=8, min_limit=1, max_limit=32,
+                              latency_tolerance=2.0, decrease_factor=0.5)
+    for _ in range(20):
+        for operation, latency in (("classification", 0.01), ("description", 0.04)):
+            with limiter.request(operation):
+                time.sleep(latency)
+
+    metrics = limiter.metrics()
+    assert metrics["changes"]["latency"] == 0
+    assert metrics["limit"] == 8
+    assert metrics["latency"]["description"]["baseline"] > metrics["latency"]["classification"]["baseline"]
+
+
+def test_sized_requests_compare_latency_per_unit():
+    limiter = AdaptiveLimiter("mock", initial_limit=8, min_limit=1, max_limit=32,
+                              latency_tolerance=2.0, decrease_factor=0.5)
+    for size in (1, 4, 1, 4, 1, 4):
+        with limiter.request("transcription.mp3", size=size):
+            time.sleep(0.01 * size)
+
+    assert limiter.metrics()["changes"]["latency"] == 0
@@ -0,0 +1,105 @@
+"""
+Tests for near-duplicate detection
+Uses a temporary results store and mock stages, so no Azure credentials are needed
+"""
+
+import sqlite3
+
+import pytest
+
+pytest.importorskip("config", reason="config.py not found - copy config.example.py to config.py")
+
+import config
+import main
+import whisper
+from dedup import compute_fingerprint, find_near_duplicate, fingerprint_bands
+from results_store import ResultsStore
+
+COMPLAINT = ("I ordered a blender last week and the glass jar arrived cracked. "
+             "It leaks all over the counter every time I run it and I want a replacement.")
+NEAR_DUPLICATE = ("I ordered a blender last week and the glass jar arrived cracked! "
+                  "It leaks all over the counter every time I run it, and I want a replacement.")
+UNRELATED = ("My laptop battery stops charging after ten minutes and the screen flickers "
+             "whenever I open a browser window.")
+
+CLASSIFICATION = {
+    "category": "Home & Kitchen",
+    "subcategory": "Appliances",
+    "reasoning": "Damaged blender jar",
+    "confidence": 0.9,
+    "model_tier": "small"
+}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SAVE_INTERMEDIATE_FILES", False)
+    monkeypatch.setattr(config, "DEDUP_ENABLED", True)
+    with ResultsStore(str(tmp_path / "results.db"), str(tmp_path / "blobs"), batch_size=100) as store:
+        yield store
+
+
+def store_complaint(store, tmp_path, transcription):
+    """Stores a processed complaint with an image blob and returns its id."""
+    image_path = tmp_path / "image.png"
+    image_path.write_bytes(b"mock image")
+    main.save_result(store, "first.mp3", transcription, "mock prompt", str(image_path),
+                     "A cracked blender jar", CLASSIFICATION, fingerprint=compute_fingerprint(transcription))
+    store.commit()
+    return store.query()[0]["id"]
+
+
+def test_near_identical_text_hits_and_unrelated_text_misses(store, tmp_path):
+    stored_id = store_complaint(store, tmp_path, COMPLAINT)
+
+    duplicate = find_near_duplicate(store, compute_fingerprint(NEAR_DUPLICATE))
+    assert duplicate is not None
+    assert duplicate["id"] == stored_id
+    assert find_near_duplicate(store, compute_fingerprint(UNRELATED)) is None
+
+
+def test_empty_transcriptions_have_no_fingerprint():
+    assert compute_fingerprint("") is None
+    assert compute_fingerprint(" ... ") is None
+
+
+def test_duplicates_are_not_lookup_candidates(store, tmp_path):
+    stored_id = store_complaint(store, tmp_path, COMPLAINT)
+    fingerprint = compute_fingerprint(NEAR_DUPLICATE)
+    for _ in range(5):
+        store.add({"transcription": NEAR_DUPLICATE, "fingerprint": fingerprint, "duplicate_of": stored_id})
+
+    candidates = store.find_by_fingerprint_bands(fingerprint_bands(fingerprint))
+    assert [candidate_id for candidate_id, _ in candidates] == [stored_id]
+
+
+def test_hit_reuses_the_stored_row_without_generating(store, tmp_path, monkeypatch):
+    stored_id = store_complaint(store, tmp_path, COMPLAINT)
+
+    def fail_generate(*args, **kwargs):
+        raise AssertionError("generate_results called for a near-duplicate")
+
+    monkeypatch.setattr(whisper, "transcribe_audio", lambda audio_file_path, save_files=None: NEAR_DUPLICATE)
+    monkeypatch.setattr(main, "generate_results", fail_generate)
+
+    result = main.process_complaint(store, "second.mp3")
+    assert result is not None
+    assert result["duplicate_of"] == stored_id
+    assert result["classification"]["category"] == CLASSIFICATION["category"]
+
+    reused = [row for row in store.query() if row["audio_path"] == "second.mp3"]
+    assert len(reused) == 1
+    assert reused[0]["duplicate_of"] == stored_id
+    assert reused[0]["description"] == "A cracked blender jar"
+
+
+def test_lookups_that_miss_do_not_commit_buffered_records(store, tmp_path):
+    store_complaint(store, tmp_path, COMPLAINT)
+    store.add({"transcription": UNRELATED, "fingerprint": compute_fingerprint(UNRELATED)})
+
+    assert find_near_duplicate(store, compute_fingerprint("The printer jams on every page")) is None
+    with sqlite3.connect(store.db_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM complaints").fetchone()[0] == 1
+
+    # A buffered record sharing a band is committed so it can be matched
+    assert find_near_duplicate(store, compute_fingerprint(UNRELATED.upper())) is not None
@@ -0,0 +1,128 @@
+"""
+Tests for the streaming batch pipeline
+Uses synthetic audio files and a mock backend, so no Azure credentials are needed
+"""
+
+import os
+import itertools
+
+import pytest
+
+pytest.importorskip("config", reason="config.py not found - copy config.example.py to config.py")
+
+from pipeline import discover_audio_files, process_stream
+from results_store import ResultsStore
+
+
+def current_rss():
+    """Returns the resident set size of this process in bytes."""
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def create_audio_tree(root, folders, files_per_folder):
+    """Creates empty audio files in nested date folders, plus a few files to ignore."""
+    for folder in range(folders):
+        folder_path = os.path.join(root, "2025", f"{folder // 28 + 1:02d}", f"{folder % 28 + 1:02d}")
+        os.makedirs(folder_path, exist_ok=True)
+        for index in range(files_per_folder):
+            open(os.path.join(folder_path, f"complaint_{index:05d}.wav"), "w").close()
+    open(os.path.join(root, "notes.txt"), "w").close()
+    open(os.path.join(root, ".gitkeep"), "w").close()
+
+
+def mock_process(store, audio_path):
+    """Mock backend that stores a result without calling any API."""
+    store.add({
+        "audio_path": audio_path,
+        "transcription": "The blender arrived with a cracked jar and it leaks when running. " * 3,
+        "category": "Home & Kitchen",
+        "subcategory": "Appliances",
+        "reasoning": "Mock classification"
+    })
+    return True
+
+
+def test_discovery_orders_files_by_mtime_and_folders_by_name(tmp_path):
+    os.makedirs(tmp_path / "2025" / "01")
+    os.makedirs(tmp_path / "2025" / "02")
+    paths = [
+        tmp_path / "loose.mp3",
+        tmp_path / "2025" / "01" / "b.WAV",
+        tmp_path / "2025" / "01" / "a.ogg",
+        tmp_path / "2025" / "02" / "c.mp3",
+    ]
+    for mtime, path in enumerate(paths, start=1):
+        path.write_bytes(b"")
+        os.utime(path, (mtime, mtime))
+    # A late arrival makes January's folder the most recently modified one
+    os.utime(tmp_path / "2025" / "01", (100, 100))
+    os.utime(tmp_path / "2025" / "02", (50, 50))
+    (tmp_path / "readme.txt").write_text("not audio")
+
+    assert list(discover_audio_files(str(tmp_path))) == [str(path) for path in paths]
+    assert list(discover_audio_files(str(tmp_path), newest_first=True)) == [
+        str(path) for path in reversed(paths)
+    ]
+
+
+def test_discovery_skips_broken_entries_and_symlink_loops(tmp_path):
+    (tmp_path / "a.wav").write_bytes(b"")
+    (tmp_path / "b.wav").write_bytes(b"")
+    os.symlink(tmp_path / "missing.wav", tmp_path / "broken.wav")
+    os.symlink(tmp_path, tmp_path / "loop")
+
+    assert sorted(discover_audio_files(str(tmp_path))) == [str(tmp_path / "a.wav"), str(tmp_path / "b.wav")]
+
+
+def test_failures_are_counted_and_do_not_stop_the_stream(tmp_path):
+    def flaky_process(store, audio_path):
+        if audio_path.endswith("1.mp3"):
+            raise RuntimeError("mock API error")
+        return mock_process(store, audio_path)
+
+    with ResultsStore(str(tmp_path / "results.db"), str(tmp_path / "blobs"), batch_size=2) as store:
+        counts = process_stream([f"{i}.mp3" for i in range(5)], flaky_process, store)
+        assert counts == {"processed": 4, "failed": 1}
+        assert len(store.query()) == 4
+
+
+def test_concurrent_workers_process_every_file(tmp_path):
+    audio_dir = str(tmp_path / "audio")
+    create_audio_tree(audio_dir, folders=3, files_per_folder=200)
+
+    with ResultsStore(str(tmp_path / "results.db"), str(tmp_path / "blobs"), batch_size=50) as store:
+        counts = process_stream(discover_audio_files(audio_dir), mock_process, store,
+                                progress_every=0, workers=8)
+        assert counts == {"processed": 600, "failed": 0}
+        assert len({result["audio_path"] for result in store.query()}) == 600
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc to read RSS")
+@pytest.mark.parametrize("folders, files_per_folder", [(100, 1000), (1, 100000)], ids=["nested", "flat"])
+def test_memory_stays_flat_over_100k_files(tmp_path, folders, files_per_folder):
+    audio_dir = str(tmp_path / "audio")
+    create_audio_tree(audio_dir, folders=folders, files_per_folder=files_per_folder)
+
+    samples = []
+    with ResultsStore(str(tmp_path / "results.db"), str(tmp_path / "blobs"), batch_size=500) as store:
+        audio_paths = discover_audio_files(audio_dir)
+
+        # Warm up caches (SQLite page cache, allocator pools) before taking the baseline
+        process_stream(itertools.islice(audio_paths, 10000), mock_process, store, progress_every=0)
+        baseline = current_rss()
+
+        for _ in range(9):
+            counts = process_stream(itertools.islice(audio_paths, 10000), mock_process, store,
+                                    progress_every=0)
+            assert counts == {"processed": 10000, "failed": 0}
+            samples.append(current_rss())
+
+        assert next(audio_paths, None) is None
+        assert store.count_by_category() == [("Home & Kitchen", "Appliances", 100000)]
+
+    # Holding the 90,000 remaining paths or results in memory would add well over 10 MB.
+    # A flat directory's listing (about 150 bytes per file) is built before the baseline.
+    growth = max(samples) - baseline
+    assert growth < 4 * 1024 * 1024, f"RSS grew by {growth / 1024 / 1024:.1f} MB"
@@ -0,0 +1,88 @@
+"""
+Tests for model tiering
+Uses a mock chat client and a temporary statistics database, so no Azure credentials are needed
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip("config", reason="config.py not found - copy config.example.py to config.py")
+
+import config
+import router
+
+
+class MockClient:
+    """Mock chat client that returns one canned response per deployment."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.deployments = []
+        self.chat = self
+        self.completions = self
+
+    def create(self, model, messages, **kwargs):
+        self.deployments.append(model)
+
+        class Message:
+            content = self.responses[model]
+
+        class Choice:
+            message = Message()
+
+        class Response:
+            choices = [Choice()]
+            usage = None
+
+        return Response()
+
+
+@pytest.fixture
+def tiers(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MODEL_TIERS", [
+        {"name": "small", "deployment": "mock-small"},
+        {"name": "large", "deployment": "mock-large"}
+    ])
+    monkeypatch.setattr(config, "CONFIDENCE_THRESHOLD", 0.7)
+    monkeypatch.setattr(config, "RESULTS_DB", str(tmp_path / "results.db"))
+    monkeypatch.setattr(config, "TIER_STATS_FILE", str(tmp_path / "tier_stats.json"))
+    router._tier_stats.clear()
+    yield
+    router._tier_stats.clear()
+
+
+def parse(text):
+    data = json.loads(text)
+    return data["answer"], router.parse_confidence(data)
+
+
+def test_nan_confidence_escalates_as_a_validation_failure(tiers):
+    client = MockClient({
+        "mock-small": '{"answer": "small", "confidence": NaN}',
+        "mock-large": '{"answer": "large", "confidence": 0.9}'
+    })
+
+    assert router.route_completion(client, [], parse) == ("large", 0.9, "large")
+    assert router.get_tier_stats()["small"]["validation_failures"] == 1
+
+
+def test_saved_statistics_accumulate_across_runs(tiers):
+    router._count("small", requests=2, accepted=1, escalations=1)
+    router.save_tier_stats()
+    router._count("small", requests=1, accepted=1)
+    report = router.save_tier_stats()
+
+    assert report["small"]["requests"] == 3
+    assert report["small"]["escalation_rate"] == pytest.approx(1 / 3)
+    with open(config.TIER_STATS_FILE, encoding="utf-8") as f:
+        assert json.load(f) == report
+    assert router.get_tier_stats() == {}
+
+
+def test_a_failed_save_keeps_the_counters_and_does_not_raise(tiers, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TIER_STATS_FILE", str(tmp_path / "missing" / "tier_stats.json"))
+    router._count("small", requests=1)
+
+    assert router.save_tier_stats() is None
+    assert router.get_tier_stats()["small"]["requests"] == 1
@@ -5,6 +5,7 @@ This can be run before testing with actual audio files
 
 import sys
 import os
+import runpy
 
 def test_imports():
     """Test that all required modules can be imported"""
@@ -77,6 +78,15 @@ def test_config():
     try:
         import config
         
+        # Check for settings added to config.example.py since config.py was copied
+        example_settings = runpy.run_path("config.example.py")
+        missing = [name for name in example_settings if name.isupper() and not hasattr(config, name)]
+        if missing:
+            print("  ✗ config.py is missing settings from config.example.py:")
+            for name in missing:
+                print(f"    - {name}")
+            return False
+        
         # Check API keys
         if config.AZURE_OPENAI_API_KEY and len(config.AZURE_OPENAI_API_KEY) > 10:
             print("  ✓ AZURE_OPENAI_API_KEY is set")
@@ -107,6 +117,9 @@ def test_config():
         if config.GPT4O_DEPLOYMENT:
             print(f"  ✓ GPT-4o deployment: {config.GPT4O_DEPLOYMENT}")
         
+        for tier in config.MODEL_TIERS:
+            print(f"  ✓ Model tier '{tier['name']}': {tier['deployment']}")
+        
         print("\n✅ Configuration looks good!")
         return True
     
@@ -1,75 +1,73 @@
 # vision.py
 
 import os
+import json
 import base64
-from openai import AzureOpenAI
-from PIL import Image, ImageDraw, ImageFont
 import config
+from router import route_completion, parse_confidence, get_chat_client
+from prompts import build_description_messages
+
+# Function to validate an image description response from the model
+
+
+def parse_description(description_text):
+    """
+    Parses and validates an image description response.
+
+    Args:
+    description_text (str): The JSON text returned by the model.
+
+    Returns:
+    tuple: The description text and its self-reported confidence.
+    """
+    data = json.loads(description_text)
+    description = data["description"]
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("empty description")
+    return description.strip(), parse_confidence(data)
+
 
 # Function to describe the generated image and annotate issues
 
 
-def describe_image(image_path):
+def describe_image(image_path, save_files=None):
     """
     Describes an image and identifies key visual elements related to the customer complaint.
 
     Args:
     image_path (str): Path to the image file to describe.
+    save_files (bool): Save image_description.txt and annotated_image.png.
+        Defaults to config.SAVE_INTERMEDIATE_FILES.
 
     Returns:
     str: A description of the image, including the annotated details.
     """
+    if save_files is None:
+        save_files = config.SAVE_INTERMEDIATE_FILES
+    
     try:
-        # Initialize the Azure OpenAI client
-        client = AzureOpenAI(
-            api_key=config.AZURE_OPENAI_API_KEY,
-            api_version=config.GPT4O_API_VERSION,
-            azure_endpoint=config.AZURE_OPENAI_ENDPOINT
-        )
-        
         # Read and encode the image to base64
         with open(image_path, "rb") as image_file:
             image_data = base64.b64encode(image_file.read()).decode("utf-8")
         
-        # Create a prompt for the vision model to describe the image
-        response = client.chat.completions.create(
-            model=config.GPT4O_DEPLOYMENT,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert at analyzing product images and identifying defects, issues, or problems. Provide a detailed description of what you see in the image, focusing on any issues, damages, or problems visible."
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Please describe this image in detail, focusing on any visible issues, problems, or defects. What product is shown? What is wrong with it?"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{image_data}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=500
+        # Ask the model tiers to describe the image, escalating on low confidence
+        description, confidence, tier = route_completion(
+            get_chat_client(),
+            build_description_messages(image_data),
+            parse_description,
+            operation="description",
+            max_tokens=500,
+            response_format={"type": "json_object"}
         )
         
-        # Extract the description
-        description = response.choices[0].message.content
-        
-        # Save the description to output directory
-        description_path = os.path.join(config.OUTPUT_DIR, "image_description.txt")
-        with open(description_path, "w", encoding="utf-8") as f:
-            f.write(description)
-        
-        print(f"✓ Image description completed and saved to {description_path}")
-        
-        # Create an annotated version of the image
-        annotate_image(image_path, description)
+        # Save the description and an annotated version of the image to output directory
+        if save_files:
+            description_path = save_description(description)
+            print(f"✓ Image description completed by {tier} tier "
+                  f"(confidence {confidence:.2f}) and saved to {description_path}")
+            annotate_image(image_path, description)
+        else:
+            print(f"✓ Image description completed by {tier} tier (confidence {confidence:.2f})")
         
         return description
     
@@ -78,6 +76,22 @@ def describe_image(image_path):
         raise
 
 
+def save_description(description):
+    """
+    Saves the image description to image_description.txt in the output directory.
+
+    Args:
+    description (str): The description of the image.
+
+    Returns:
+    str: The path to the saved description.
+    """
+    description_path = os.path.join(config.OUTPUT_DIR, "image_description.txt")
+    with open(description_path, "w", encoding="utf-8") as f:
+        f.write(description)
+    return description_path
+
+
 def annotate_image(image_path, description):
     """
     Annotates the image with a text overlay showing the issue description.
@@ -87,6 +101,8 @@ def annotate_image(image_path, description):
     description (str): The description of the issue.
     """
     try:
+        from PIL import Image, ImageDraw, ImageFont
+        
         # Open the image
         img = Image.open(image_path)
         draw = ImageDraw.Draw(img)
@@ -1,47 +1,66 @@
 # whisper.py
 
 import os
-from openai import AzureOpenAI
 import config
+from concurrency import call_with_retries
 
 # Function to transcribe customer audio complaints using the Whisper model
 
 
-def transcribe_audio(audio_file_path):
+def transcribe_audio(audio_file_path, save_files=None):
     """
     Transcribes an audio file into text using OpenAI's Whisper model.
 
     Args:
     audio_file_path (str): Path to the audio file to transcribe.
+    save_files (bool): Save transcription.txt. Defaults to config.SAVE_INTERMEDIATE_FILES.
 
     Returns:
     str: The transcribed text of the audio file.
     """
+    if save_files is None:
+        save_files = config.SAVE_INTERMEDIATE_FILES
+    
     try:
-        # Initialize the Azure OpenAI client
+        from openai import AzureOpenAI
+        
+        # Initialize the Azure OpenAI client; retries are made by call_with_retries outside
+        # the limiter slot, so the client's own retries are disabled
         client = AzureOpenAI(
             api_key=config.AZURE_OPENAI_API_KEY,
             api_version=config.WHISPER_API_VERSION,
-            azure_endpoint=config.AZURE_COGNITIVE_ENDPOINT
+            azure_endpoint=config.AZURE_COGNITIVE_ENDPOINT,
+            max_retries=0
         )
         
+        # Transcription latency grows with the length of the audio, so the limiter compares
+        # latency per megabyte, separately for each audio format
+        audio_megabytes = max(os.path.getsize(audio_file_path) / (1024 * 1024), 0.01)
+        operation = "transcription" + os.path.splitext(audio_file_path)[1].lower()
+        
         # Open and read the audio file
         with open(audio_file_path, "rb") as audio_file:
-            # Call the Whisper model to transcribe the audio
-            transcription = client.audio.transcriptions.create(
-                model=config.WHISPER_DEPLOYMENT,
-                file=audio_file
-            )
+            def transcribe():
+                audio_file.seek(0)
+                return client.audio.transcriptions.create(
+                    model=config.WHISPER_DEPLOYMENT,
+                    file=audio_file
+                )
+            
+            # Call the Whisper model to transcribe the audio, within the deployment's adaptive limit
+            transcription = call_with_retries(config.WHISPER_DEPLOYMENT, transcribe, operation, audio_megabytes)
         
         # Extract the transcribed text
         transcribed_text = transcription.text
         
         # Save the transcription to output directory
-        output_path = os.path.join(config.OUTPUT_DIR, "transcription.txt")
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(transcribed_text)
-        
-        print(f"✓ Audio transcription completed and saved to {output_path}")
+        if save_files:
+            output_path = os.path.join(config.OUTPUT_DIR, "transcription.txt")
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(transcribed_text)
+            print(f"✓ Audio transcription completed and saved to {output_path}")
+        else:
+            print("✓ Audio transcription completed")
         return transcribed_text
     
     except Exception as e: